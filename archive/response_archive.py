@@ -0,0 +1,242 @@
+from datetime import datetime, timedelta
+import gzip
+import hashlib
+from importlib.util import find_spec
+import json
+import logging
+import os
+import shutil
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# zstandard is optional, gzip is used when it is not installed
+if find_spec("zstandard") is not None:
+    import zstandard
+else:
+    zstandard = None
+
+
+class ResponseArchive:
+    """
+    Content addressed, compressed store of raw responses, indexed per run by request and fetch time
+    """
+
+    def __init__(self, archive_path: str, run_id: str, replay: bool = False):
+        self.archive_path = archive_path
+        self.run_id = run_id
+        self.replay = replay
+        self.pid = os.getpid()
+        self.blob_dir = os.path.join(archive_path, "blobs")
+        self.run_dir = os.path.join(archive_path, "runs", run_id)
+        # One index file per process so concurrent pullers never interleave writes
+        self.index_path = os.path.join(self.run_dir, "index-%s.jsonl" % self.pid)
+        self.write_lock = threading.Lock()
+        self.replay_index = None
+        if replay:
+            self.replay_index = self.load_index()
+        else:
+            os.makedirs(self.run_dir, exist_ok=True)
+
+    def request_key(self, method: str, url: str, payload=None):
+        """
+        Key identifying a request by method, URL and JSON payload
+        """
+        payload_str = "" if payload is None else json.dumps(payload, sort_keys=True)
+        return "%s %s %s" % (method, url, payload_str)
+
+    def blob_path(self, digest: str, compression: str):
+        return os.path.join(self.blob_dir, digest[:2], "%s.%s" % (digest, compression))
+
+    def compress(self, content_bytes: bytes):
+        if zstandard is not None:
+            return zstandard.ZstdCompressor().compress(content_bytes), "zst"
+
+        return gzip.compress(content_bytes), "gz"
+
+    def decompress(self, compressed_bytes: bytes, compression: str):
+        if compression == "zst":
+            if zstandard is None:
+                raise ValueError("zstandard required to read archived blob")
+            return zstandard.ZstdDecompressor().decompress(compressed_bytes)
+
+        return gzip.decompress(compressed_bytes)
+
+    def store(self, url: str, content: str, method: str = "GET", payload=None):
+        """
+        Write a response body once per unique content and record it in this run's index
+        """
+        content_bytes = content.encode("utf-8")
+        digest = hashlib.sha256(content_bytes).hexdigest()
+        compressed_bytes, compression = self.compress(content_bytes)
+        blob_path = self.blob_path(digest, compression)
+        if os.path.exists(blob_path):
+            # Refreshed so pruning, which spares recent blobs, keeps it for this run
+            os.utime(blob_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_blob_path = "%s.%s.tmp" % (blob_path, os.getpid())
+            with open(tmp_blob_path, "wb") as blob_file:
+                blob_file.write(compressed_bytes)
+            os.replace(tmp_blob_path, blob_path)
+
+        index_entry = {
+            "key": self.request_key(method, url, payload),
+            "url": url,
+            "method": method,
+            "fetched_at": datetime.now().isoformat(),
+            "digest": digest,
+            "compression": compression,
+        }
+        with self.write_lock:
+            with open(self.index_path, "a") as index_file:
+                index_file.write(json.dumps(index_entry) + "\n")
+
+    def load_index(self):
+        """
+        Load every index file of the run, keeping the latest fetch of each request
+        """
+        if not os.path.isdir(self.run_dir):
+            raise ValueError(
+                "No archived run %s in %s" % (self.run_id, self.archive_path)
+            )
+
+        index_entries = []
+        for index_file_name in os.listdir(self.run_dir):
+            with open(os.path.join(self.run_dir, index_file_name), "r") as index_file:
+                index_entries += [json.loads(x) for x in index_file if x.strip() != ""]
+        index_entries.sort(key=lambda x: x["fetched_at"])
+        logger.info(
+            "Loaded %s archived responses for run %s"
+            % (len(index_entries), self.run_id)
+        )
+
+        return {x["key"]: x for x in index_entries}
+
+    def is_archived(self, url: str, method: str = "GET", payload=None):
+        return self.request_key(method, url, payload) in self.replay_index
+
+    def latest_fetched_at(self):
+        """
+        Time of the run's last archived fetch, or None if it archived nothing
+        """
+        if len(self.replay_index) == 0:
+            return None
+
+        return max(
+            datetime.fromisoformat(x["fetched_at"]) for x in self.replay_index.values()
+        )
+
+    def load(self, url: str, method: str = "GET", payload=None):
+        """
+        Return the archived body of a request, raising KeyError if the run never fetched it
+        """
+        index_entry = self.replay_index[self.request_key(method, url, payload)]
+        blob_path = self.blob_path(index_entry["digest"], index_entry["compression"])
+        with open(blob_path, "rb") as blob_file:
+            compressed_bytes = blob_file.read()
+
+        return self.decompress(compressed_bytes, index_entry["compression"]).decode(
+            "utf-8"
+        )
+
+
+ACTIVE_ARCHIVE = None
+
+
+def activate_archive(archive_path: str, run_id: str, replay: bool = False):
+    """
+    Set the archive that fetched responses are written to, or replayed from
+    """
+    global ACTIVE_ARCHIVE
+    # Reused within a process, but rebuilt in forked workers so each writes its own index file
+    if (
+        ACTIVE_ARCHIVE is not None
+        and ACTIVE_ARCHIVE.archive_path == archive_path
+        and ACTIVE_ARCHIVE.run_id == run_id
+        and ACTIVE_ARCHIVE.replay == replay
+        and ACTIVE_ARCHIVE.pid == os.getpid()
+    ):
+        return ACTIVE_ARCHIVE
+    ACTIVE_ARCHIVE = ResponseArchive(archive_path, run_id, replay=replay)
+
+    return ACTIVE_ARCHIVE
+
+
+def is_replaying():
+    return ACTIVE_ARCHIVE is not None and ACTIVE_ARCHIVE.replay
+
+
+def archive_response(url: str, content: str, method: str = "GET", payload=None):
+    """
+    Store a fetched response in the active archive, if archiving
+    """
+    if ACTIVE_ARCHIVE is None or ACTIVE_ARCHIVE.replay:
+        return
+    try:
+        ACTIVE_ARCHIVE.store(url, content, method=method, payload=payload)
+    except OSError:
+        logger.exception("Failed to archive response for %s" % url)
+
+
+def replay_response(url: str, method: str = "GET", payload=None):
+    """
+    Serve a response from the active replay archive
+    """
+    return ACTIVE_ARCHIVE.load(url, method=method, payload=payload)
+
+
+def is_archived(url: str, method: str = "GET", payload=None):
+    """
+    Whether the active replay archive holds a response for the request
+    """
+    return is_replaying() and ACTIVE_ARCHIVE.is_archived(
+        url, method=method, payload=payload
+    )
+
+
+def prune_archive(archive_path: str, max_age_days: float):
+    """
+    Delete runs last written more than max_age_days ago, then blobs as old that no remaining run indexes.
+    Returns the number of runs and blobs deleted
+    """
+    cutoff_time = (datetime.now() - timedelta(days=max_age_days)).timestamp()
+    runs_dir = os.path.join(archive_path, "runs")
+    blob_dir = os.path.join(archive_path, "blobs")
+    n_runs_pruned = 0
+    kept_digests = set()
+    if os.path.isdir(runs_dir):
+        for run_id in os.listdir(runs_dir):
+            run_dir = os.path.join(runs_dir, run_id)
+            if os.path.getmtime(run_dir) < cutoff_time:
+                shutil.rmtree(run_dir, ignore_errors=True)
+                n_runs_pruned += 1
+                continue
+            for index_file_name in os.listdir(run_dir):
+                with open(os.path.join(run_dir, index_file_name), "r") as index_file:
+                    kept_digests.update(
+                        json.loads(x)["digest"] for x in index_file if x.strip() != ""
+                    )
+
+    n_blobs_pruned = 0
+    if os.path.isdir(blob_dir):
+        for prefix_dir_name in os.listdir(blob_dir):
+            prefix_dir = os.path.join(blob_dir, prefix_dir_name)
+            for blob_file_name in os.listdir(prefix_dir):
+                blob_path = os.path.join(prefix_dir, blob_file_name)
+                # Blobs written or reused since the cutoff may belong to a run still writing its index
+                if (
+                    blob_file_name.split(".")[0] in kept_digests
+                    or os.path.getmtime(blob_path) >= cutoff_time
+                ):
+                    continue
+                os.remove(blob_path)
+                n_blobs_pruned += 1
+
+    logger.info(
+        "Pruned %s archived runs and %s blobs older than %s days"
+        % (n_runs_pruned, n_blobs_pruned, max_age_days)
+    )
+
+    return n_runs_pruned, n_blobs_pruned
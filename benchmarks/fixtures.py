@@ -0,0 +1,197 @@
+# Synthetic payloads shaped like each source's responses, for running parsers without a browser or network.
+# Checked-in payloads in fixture_payloads/ are varied per record id so fixtures scale to any record count.
+
+from copy import deepcopy
+import json
+import os
+from string import Template
+import utils
+
+FIXTURE_PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), "fixture_payloads")
+
+
+def load_payload(payload_file_name: str):
+    """
+    Read a checked-in payload from fixture_payloads
+    """
+    with open(
+        os.path.join(FIXTURE_PAYLOAD_DIR, payload_file_name), "r", encoding="utf-8"
+    ) as payload_file:
+        return payload_file.read()
+
+
+ROOM_RENTAL_PAYLOAD = json.loads(load_payload("room_rental.json"))
+KAMERNET_LISTING_PAYLOAD = json.loads(load_payload("kamernet_listing.json"))
+PARARIUS_DETAIL_TEMPLATE = Template(load_payload("pararius_detail.html"))
+FUNDA_DETAIL_TEMPLATE = Template(load_payload("funda_detail.html"))
+# Room rentals whose id mod 10 is a key take one of the irregular shapes the API returns: the postcode key instead of
+# postalcode, no postal code at all, or nested objects given as null
+ROOM_RENTAL_VARIANTS = {7: "postcode", 8: "no_postal_code", 9: "missing_nested"}
+ROOM_MISSING_NESTED_KEYS = ("quarter", "sleepingRoom")
+
+
+def build_room_rental(rental_i: int):
+    """
+    Build a single synthetic rental shaped like a Room Hexia API rental, in the variant given by ROOM_RENTAL_VARIANTS
+    """
+    rental = deepcopy(ROOM_RENTAL_PAYLOAD)
+    rental.update(
+        {
+            "ID": rental_i,
+            "postalcode": "23%02.0fAB" % (rental_i % 30),
+            "houseNumber": rental_i % 200,
+            "areaDwelling": 20 + rental_i % 80,
+            "totalRent": 500 + rental_i % 1000,
+            "numberOfReactions": rental_i % 300,
+            "urlKey": "%s-breestraat-leiden" % rental_i,
+        }
+    )
+    rental["floor"]["verdieping"] = rental_i % 6
+
+    variant = ROOM_RENTAL_VARIANTS.get(rental_i % 10)
+    if variant == "postcode":
+        rental["postcode"] = rental.pop("postalcode")
+    elif variant == "no_postal_code":
+        del rental["postalcode"]
+    elif variant == "missing_nested":
+        for nested_key in ROOM_MISSING_NESTED_KEYS:
+            rental[nested_key] = None
+
+    return rental
+
+
+def build_kamernet_listing(listing_i: int):
+    """
+    Build a single synthetic listing shaped like a Kamernet findlistings result
+    """
+    listing = dict(KAMERNET_LISTING_PAYLOAD)
+    listing.update(
+        {
+            "listingId": 2000000 + listing_i,
+            "furnishingId": 1 + listing_i % 4,
+            "availabilityStartDate": "2024-%02.0f-01T00:00:00" % (1 + listing_i % 12),
+            "availabilityEndDate": (
+                None
+                if listing_i % 3
+                else "2025-%02.0f-01T00:00:00" % (1 + listing_i % 12)
+            ),
+            "surfaceArea": 10 + listing_i % 60,
+            "listingType": (1, 2, 4)[listing_i % 3],
+            "totalRentalPrice": 400 + listing_i % 1200,
+        }
+    )
+
+    return listing
+
+
+def build_page_noise(n_blocks: int = 300):
+    """
+    Build filler markup standing in for navigation, scripts and recommendations on a real page
+    """
+    noise_blocks = [
+        '<div class="card card--%s"><a href="/other/%s" class="card__link">'
+        '<span class="card__title">Other listing %s</span></a>'
+        '<ul class="card__features"><li>%s m²</li><li>€%s</li></ul></div>'
+        % (x % 7, x, x, 20 + x % 50, 600 + x)
+        for x in range(n_blocks)
+    ]
+    noise_script = "<script>window.__STATE__ = {%s};</script>" % ",".join(
+        '"k%s": "%s"' % (x, "v" * 40) for x in range(n_blocks)
+    )
+
+    return "".join(noise_blocks) + noise_script
+
+
+def pararius_listing_link(listing_i: int):
+    return "/apartment-for-rent/leiden/%08x/breestraat" % listing_i
+
+
+def build_pararius_detail_page(listing_i: int, n_noise_blocks: int = 300):
+    """
+    Build a Pararius listing detail page carrying the elements Pararius.parse_rental_obj reads
+    """
+    return PARARIUS_DETAIL_TEMPLATE.substitute(
+        page_noise=build_page_noise(n_noise_blocks),
+        postal_code="23%02.0f AB" % (listing_i % 30),
+        # Every other price carries cents, which the normalisation stage drops
+        rent="{:,}{}".format(1000 + listing_i % 900, ".50" if listing_i % 2 else ""),
+        area=20 + listing_i % 80,
+    )
+
+
+def funda_listing_link(listing_i: int):
+    return "https://www.funda.nl/huur/leiden/appartement-%08d-breestraat-%s/" % (
+        listing_i,
+        listing_i % 200,
+    )
+
+
+def build_funda_json_ld(listing_i: int):
+    """
+    Build the JSON-LD script of a Funda listing detail page, matching its DOM elements
+    """
+    listing_obj = {
+        "@context": "https://schema.org",
+        "@type": ["Product", "Apartment"],
+        "name": "Breestraat %s A" % (listing_i % 200),
+        "address": {
+            "@type": "PostalAddress",
+            "streetAddress": "Breestraat %s A" % (listing_i % 200),
+            "postalCode": "23%02.0f AB" % (listing_i % 30),
+            "addressLocality": "Leiden",
+        },
+        "floorSize": {"@type": "QuantitativeValue", "value": 20 + listing_i % 80},
+        "offers": {
+            "@type": "Offer",
+            "price": 1000 + listing_i % 900,
+            "priceCurrency": "EUR",
+            "availability": "https://schema.org/LimitedAvailability",
+        },
+    }
+
+    return '<script type="application/ld+json">%s</script>' % json.dumps(listing_obj)
+
+
+def build_funda_detail_page(
+    listing_i: int, n_noise_blocks: int = 300, with_json_ld: bool = True
+):
+    """
+    Build a Funda listing detail page carrying the elements Funda.parse_rental_obj reads,
+    without JSON-LD to exercise the DOM walk fallback
+    """
+    return FUNDA_DETAIL_TEMPLATE.substitute(
+        json_ld=build_funda_json_ld(listing_i) if with_json_ld else "",
+        page_noise=build_page_noise(n_noise_blocks),
+        house_number=listing_i % 200,
+        postal_code="23%02.0f AB" % (listing_i % 30),
+        area=20 + listing_i % 80,
+        rent="{:,}".format(1000 + listing_i % 900),
+    )
+
+
+class FixtureDriver:
+    """
+    Stands in for utils.Driver, serving stored page sources by URL instead of loading them in a browser.
+    pages is a dict of URL to page source, or a callable building the page source for a URL
+    """
+
+    def __init__(self, pages, html_parser: str = utils.DEFAULT_HTML_PARSER):
+        self.pages = pages if callable(pages) else pages.__getitem__
+        self.html_parser = html_parser
+
+    def soup_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+        parse_only=None,
+    ):
+        return utils.soup_from_source(
+            self.pages(url), parse_only=parse_only, html_parser=self.html_parser
+        )
+
+    def source_get(
+        self, url: str, test_element_class: str, by_method, load_delay: int = 10
+    ):
+        return self.pages(url)
@@ -0,0 +1,142 @@
+# Benchmark of Pararius/Funda detail page parsing across HTML parser backends, with and without subtree strainers.
+# Run from the repo root: python -m benchmarks.html_parse_benchmark [--pararius-pages DIR] [--funda-pages DIR]
+
+import argparse
+from benchmarks.fixtures import (
+    FixtureDriver,
+    build_funda_detail_page,
+    build_pararius_detail_page,
+    funda_listing_link,
+    pararius_listing_link,
+)
+from importlib.util import find_spec
+import os
+import puller_configs
+from pullers import Funda, Pararius
+from time import perf_counter
+import utils
+
+
+def parse_modes():
+    """
+    Parser backend and strainer combinations to compare
+    """
+    modes = [("html.parser", False), ("html.parser", True)]
+    if find_spec("lxml") is not None:
+        modes += [("lxml", False), ("lxml", True)]
+
+    return modes
+
+
+def time_puller_parse(puller, listing_links: list, pages: dict, html_parser: str):
+    """
+    Time parse_rental_obj over all listing links on a fixture driver
+    """
+    fixture_driver = FixtureDriver(pages, html_parser=html_parser)
+    start_time = perf_counter()
+    parsed = [puller.parse_rental_obj(x, driver=fixture_driver) for x in listing_links]
+    total_time = perf_counter() - start_time
+
+    return total_time, parsed
+
+
+def benchmark_puller(puller_name: str, puller, listing_links: list, pages: dict):
+    """
+    Compare parse time per mode, checking every mode parses identical listings
+    """
+    full_detail_strainer = puller.detail_strainer
+    baseline_time = None
+    baseline_parsed = None
+    for html_parser, use_strainer in parse_modes():
+        puller.detail_strainer = full_detail_strainer if use_strainer else None
+        total_time, parsed = time_puller_parse(
+            puller, listing_links, pages, html_parser
+        )
+        if baseline_parsed is None:
+            baseline_time = total_time
+            baseline_parsed = parsed
+        elif parsed != baseline_parsed:
+            raise ValueError(
+                "%s parse with %s (strainer=%s) differs from baseline"
+                % (puller_name, html_parser, use_strainer)
+            )
+        print(
+            "%s %-11s strainer=%-5s %.2fms/page (%.1fx)"
+            % (
+                puller_name,
+                html_parser,
+                use_strainer,
+                total_time / len(listing_links) * 1000,
+                baseline_time / total_time,
+            )
+        )
+    puller.detail_strainer = full_detail_strainer
+
+
+def benchmark_saved_pages(source_name: str, page_dir: str, strainer):
+    """
+    Time soup building alone over saved page sources
+    """
+    page_sources = []
+    for page_file_name in sorted(os.listdir(page_dir)):
+        with open(os.path.join(page_dir, page_file_name), "r") as page_file:
+            page_sources.append(page_file.read())
+    for html_parser, use_strainer in parse_modes():
+        start_time = perf_counter()
+        for page_source in page_sources:
+            utils.soup_from_source(
+                page_source,
+                parse_only=strainer if use_strainer else None,
+                html_parser=html_parser,
+            )
+        total_time = perf_counter() - start_time
+        print(
+            "saved %s %-11s strainer=%-5s %.2fms/page"
+            % (
+                source_name,
+                html_parser,
+                use_strainer,
+                total_time / len(page_sources) * 1000,
+            )
+        )
+
+
+def run_benchmark(
+    n_pages: int = 50, pararius_pages: str = None, funda_pages: str = None
+):
+    pararius = Pararius(fetch_results=False, incremental=False)
+    pararius_links = [pararius_listing_link(x) for x in range(n_pages)]
+    pararius_page_sources = {
+        pararius.detail_url(link): build_pararius_detail_page(x)
+        for x, link in enumerate(pararius_links)
+    }
+    benchmark_puller("pararius", pararius, pararius_links, pararius_page_sources)
+
+    funda = Funda(fetch_results=False, incremental=False)
+    funda_links = [funda_listing_link(x) for x in range(n_pages)]
+    # Without JSON-LD, so Funda pages are parsed by the DOM walk this benchmark compares parsers on
+    funda_page_sources = {
+        funda.detail_url(link): build_funda_detail_page(x, with_json_ld=False)
+        for x, link in enumerate(funda_links)
+    }
+    benchmark_puller("funda", funda, funda_links, funda_page_sources)
+
+    if pararius_pages is not None:
+        benchmark_saved_pages("pararius", pararius_pages, pararius.detail_strainer)
+    if funda_pages is not None:
+        benchmark_saved_pages("funda", funda_pages, funda.detail_strainer)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--n-pages", type=int, default=50)
+    arg_parser.add_argument(
+        "--pararius-pages", help="Directory of saved Pararius pages"
+    )
+    arg_parser.add_argument("--funda-pages", help="Directory of saved Funda pages")
+    args = arg_parser.parse_args()
+    run_benchmark(
+        n_pages=args.n_pages,
+        pararius_pages=args.pararius_pages,
+        funda_pages=args.funda_pages,
+    )
@@ -0,0 +1,232 @@
+# Throughput and peak memory of each puller's parsing hot path over synthetic fixtures, no browser or network needed.
+# Run from the repo root: python -m benchmarks.parser_benchmark [--sources room kamernet] [--n-records 10000]
+# [--output results.json] [--baseline results.json]
+
+import argparse
+from benchmarks.fixtures import (
+    FixtureDriver,
+    build_funda_detail_page,
+    build_kamernet_listing,
+    build_pararius_detail_page,
+    build_room_rental,
+    funda_listing_link,
+    pararius_listing_link,
+)
+import json
+from pullers import Funda, Kamernet, Pararius, Room
+import sys
+from time import perf_counter
+import tracemalloc
+
+# Detail page parses are ~1000x slower than API record parses, so they default to fewer records
+DEFAULT_N_RECORDS = {
+    "room": 10000,
+    "kamernet": 10000,
+    "pararius": 1000,
+    "funda": 1000,
+    "funda_dom": 1000,
+}
+DEFAULT_MEMORY_SAMPLE = 1000
+# Distinct detail pages built per case. They are built before the clock starts and cycled through, so detail page
+# timings cover parsing only, like the API sources, while memory stays flat
+PAGE_SAMPLE_SIZE = 100
+DEFAULT_TOLERANCE = 0.2
+
+
+def room_case(n_records: int):
+    """
+    Room.parse_rentals over n synthetic Hexia rentals
+    """
+    room = Room(fetch_results=False)
+    rentals = [build_room_rental(x) for x in range(n_records)]
+
+    return lambda: room.parse_rentals(rentals=rentals)
+
+
+def kamernet_case(n_records: int):
+    """
+    Kamernet.parse_rentals over n synthetic findlistings results
+    """
+    kamernet = Kamernet(fetch_results=False)
+    listings = [build_kamernet_listing(x) for x in range(n_records)]
+
+    return lambda: kamernet.parse_rentals(rentals=listings)
+
+
+def pararius_case(n_records: int):
+    """
+    Pararius.parse_rental_obj over n listing links, cycling through a sample of prebuilt pages
+    """
+    pararius = Pararius(fetch_results=False, incremental=False)
+    listing_links = [pararius_listing_link(x) for x in range(n_records)]
+    sample_pages = [
+        build_pararius_detail_page(x) for x in range(min(n_records, PAGE_SAMPLE_SIZE))
+    ]
+    fixture_driver = FixtureDriver(
+        {
+            pararius.detail_url(x): sample_pages[i % len(sample_pages)]
+            for i, x in enumerate(listing_links)
+        }
+    )
+
+    return lambda: [
+        pararius.parse_rental_obj(x, driver=fixture_driver) for x in listing_links
+    ]
+
+
+def funda_case(n_records: int, with_json_ld: bool = True):
+    """
+    Funda.parse_rental_obj over n listing links, cycling through a sample of prebuilt pages
+    """
+    funda = Funda(fetch_results=False, incremental=False)
+    listing_links = [funda_listing_link(x) for x in range(n_records)]
+    sample_pages = [
+        build_funda_detail_page(x, with_json_ld=with_json_ld)
+        for x in range(min(n_records, PAGE_SAMPLE_SIZE))
+    ]
+    fixture_driver = FixtureDriver(
+        {
+            funda.detail_url(x): sample_pages[i % len(sample_pages)]
+            for i, x in enumerate(listing_links)
+        }
+    )
+
+    return lambda: [
+        funda.parse_rental_obj(x, driver=fixture_driver) for x in listing_links
+    ]
+
+
+BENCHMARK_CASES = {
+    "room": room_case,
+    "kamernet": kamernet_case,
+    "pararius": pararius_case,
+    "funda": funda_case,
+    # Funda pages without JSON-LD, parsed by the DOM walk fallback
+    "funda_dom": lambda n_records: funda_case(n_records, with_json_ld=False),
+}
+
+
+def run_case(source_name: str, n_records: int, memory_sample: int):
+    """
+    Time a full parse of n records, then trace peak memory over a parse of the sample
+    """
+    parse_func = BENCHMARK_CASES[source_name](n_records)
+    start_time = perf_counter()
+    parsed = parse_func()
+    total_time = perf_counter() - start_time
+    n_parsed = len([x for x in parsed if x is not None])
+    if n_parsed != n_records:
+        raise ValueError(
+            "%s parsed %s of %s records" % (source_name, n_parsed, n_records)
+        )
+    del parsed
+
+    # Fixtures are built before tracing, so the peak covers parsing and its output only
+    sample_size = min(memory_sample, n_records)
+    sample_parse_func = BENCHMARK_CASES[source_name](sample_size)
+    tracemalloc.start()
+    sample_parse_func()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "n_records": n_records,
+        "total_sec": total_time,
+        "records_per_sec": n_records / total_time,
+        "memory_sample": sample_size,
+        "peak_mib": peak_bytes / 2**20,
+    }
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float):
+    """
+    Sources whose throughput fell, or peak memory grew, by more than tolerance against baseline
+    """
+    regressions = []
+    for source_name, source_result in results.items():
+        if source_name not in baseline:
+            continue
+        baseline_result = baseline[source_name]
+        if source_result["records_per_sec"] < baseline_result["records_per_sec"] * (
+            1 - tolerance
+        ):
+            regressions.append(
+                "%s throughput %.0f records/sec, baseline %.0f"
+                % (
+                    source_name,
+                    source_result["records_per_sec"],
+                    baseline_result["records_per_sec"],
+                )
+            )
+        if source_result["memory_sample"] == baseline_result["memory_sample"] and (
+            source_result["peak_mib"] > baseline_result["peak_mib"] * (1 + tolerance)
+        ):
+            regressions.append(
+                "%s peak memory %.2fMiB, baseline %.2fMiB"
+                % (source_name, source_result["peak_mib"], baseline_result["peak_mib"])
+            )
+
+    return regressions
+
+
+def run_benchmark(
+    sources: list = None,
+    n_records: int = None,
+    memory_sample: int = DEFAULT_MEMORY_SAMPLE,
+):
+    """
+    Benchmark each source's parser, printing and returning records/sec and peak memory
+    """
+    sources = sources or list(BENCHMARK_CASES)
+    results = {}
+    for source_name in sources:
+        source_n_records = n_records or DEFAULT_N_RECORDS[source_name]
+        results[source_name] = run_case(source_name, source_n_records, memory_sample)
+        print(
+            "%-9s %7s records %10.0f records/sec  peak %.2fMiB per %s records"
+            % (
+                source_name,
+                source_n_records,
+                results[source_name]["records_per_sec"],
+                results[source_name]["peak_mib"],
+                results[source_name]["memory_sample"],
+            )
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--sources", nargs="+", choices=list(BENCHMARK_CASES), default=None
+    )
+    arg_parser.add_argument(
+        "--n-records", type=int, default=None, help="Records per source"
+    )
+    arg_parser.add_argument("--memory-sample", type=int, default=DEFAULT_MEMORY_SAMPLE)
+    arg_parser.add_argument("--output", help="Write results to this JSON file")
+    arg_parser.add_argument(
+        "--baseline", help="Fail on regression against this results JSON file"
+    )
+    arg_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = arg_parser.parse_args()
+
+    benchmark_results = run_benchmark(
+        sources=args.sources,
+        n_records=args.n_records,
+        memory_sample=args.memory_sample,
+    )
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump(benchmark_results, output_file, indent=4)
+    if args.baseline is not None:
+        with open(args.baseline, "r") as baseline_file:
+            baseline_results = json.load(baseline_file)
+        found_regressions = find_regressions(
+            benchmark_results, baseline_results, args.tolerance
+        )
+        for regression in found_regressions:
+            print("REGRESSION %s" % regression)
+        if found_regressions:
+            sys.exit(1)
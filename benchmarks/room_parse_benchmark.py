@@ -0,0 +1,124 @@
+# Micro-benchmark of Room rental parsing, comparing the compiled extractor against the previous recursive keymap walk.
+# Run from the repo root: python -m benchmarks.room_parse_benchmark
+
+from benchmarks.fixtures import ROOM_RENTAL_VARIANTS, build_room_rental
+from copy import deepcopy
+import puller_configs
+from pullers import Room
+from time import perf_counter
+
+
+def legacy_parse_rental_obj(
+    rental_obj: dict, layer1_target_keys: list, layern_target_keys: list
+):
+    """
+    Previous recursive Room.parse_rental_obj, kept as the benchmark baseline.
+    A nested object given as null yields None, as in the extractor, where the previous walk raised
+    """
+    parsed_results = {}
+    if layer1_target_keys is not None:
+        l1_results = {x: rental_obj[x] for x in layer1_target_keys}
+        parsed_results.update(l1_results)
+        if layern_target_keys is None:
+            return l1_results
+    l2_results = {}
+    for ln_key in layern_target_keys:
+        layernm1_key = ln_key.pop(0)
+        layernm1_obj = rental_obj[layernm1_key]
+        if layernm1_obj is None:
+            l2_results["%s_%s" % (layernm1_key, ln_key[0])] = None
+            continue
+        if len(ln_key) == 1:
+            ln_key_str = ln_key[0]
+            ln_result = legacy_parse_rental_obj(
+                layernm1_obj, layer1_target_keys=ln_key, layern_target_keys=None
+            )
+            ln_result_key = "%s_%s" % (layernm1_key, ln_key_str)
+            l2_results[ln_result_key] = ln_result[ln_key_str]
+
+    parsed_results.update(l2_results)
+
+    return parsed_results
+
+
+def legacy_parse_rentals(rentals: list, site_domain: str, db_mapping_dict: dict):
+    """
+    Previous Room.parse_rentals loop with per rental deepcopy of both keymaps. A postcode key stands in for
+    postalcode under its column, as in the extractor, where the previous rename raised
+    """
+    shortened_results = []
+    for rental_obj in rentals:
+        tmp_l1_keys = deepcopy(puller_configs.ROOM_L1_TARGET_RENTAL_KEYS)
+        tmp_ln_keys = deepcopy(puller_configs.ROOM_Ln_TARGET_RENTAL_KEYS)
+        if "postalcode" not in rental_obj:
+            tmp_l1_keys.remove("postalcode")
+            if "postcode" in rental_obj:
+                rental_obj = dict(rental_obj, postalcode=rental_obj["postcode"])
+                tmp_l1_keys.append("postalcode")
+        truncated_info_dict = legacy_parse_rental_obj(
+            rental_obj, tmp_l1_keys, tmp_ln_keys
+        )
+        amenity_details = truncated_info_dict["specifiekeVoorzieningen"]
+        amenity_list = [x["localizedName"] for x in amenity_details]
+        truncated_info_dict["specifiekeVoorzieningen"] = ", ".join(amenity_list)
+        truncated_info_dict["domain"] = site_domain
+        renamed_info_dict = {
+            db_mapping_dict[k]: v for k, v in truncated_info_dict.items()
+        }
+        shortened_results.append(renamed_info_dict)
+
+    return shortened_results
+
+
+def time_parse(parse_func, n_rentals: int):
+    """
+    Time a parse function, returning the parsed rentals, total seconds and microseconds per record
+    """
+    start_time = perf_counter()
+    parsed = parse_func()
+    total_time = perf_counter() - start_time
+    if len(parsed) != n_rentals:
+        raise ValueError(
+            "Expected %s parsed rentals, got %s" % (n_rentals, len(parsed))
+        )
+
+    return parsed, total_time, total_time / n_rentals * 1e6
+
+
+def run_benchmark(n_rentals: int = 50000):
+    room = Room(fetch_results=False)
+    rentals = [build_room_rental(x) for x in range(n_rentals)]
+
+    legacy_parsed, legacy_time, legacy_per_record = time_parse(
+        lambda: legacy_parse_rentals(rentals, room.site_domain, room.db_mapping_dict),
+        n_rentals,
+    )
+    compiled_parsed, compiled_time, compiled_per_record = time_parse(
+        lambda: room.parse_rentals(rentals=rentals), n_rentals
+    )
+
+    # Every rental is compared, covering each of the fixture variants
+    for rental_i, (legacy_rental, compiled_rental) in enumerate(
+        zip(legacy_parsed, compiled_parsed)
+    ):
+        if legacy_rental != compiled_rental:
+            raise ValueError(
+                "Compiled extractor output differs from legacy parse for rental %s (%s)"
+                % (rental_i, ROOM_RENTAL_VARIANTS.get(rental_i % 10, "full"))
+            )
+
+    print(
+        "Room parse of %s synthetic rentals, %s in variants %s"
+        % (
+            n_rentals,
+            len([x for x in range(n_rentals) if x % 10 in ROOM_RENTAL_VARIANTS]),
+            ", ".join(ROOM_RENTAL_VARIANTS.values()),
+        )
+    )
+    print("legacy:   %.2fs total, %.2fus/record" % (legacy_time, legacy_per_record))
+    print("compiled: %.2fs total, %.2fus/record" % (compiled_time, compiled_per_record))
+    print("speedup:  %.1fx" % (legacy_time / compiled_time))
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,14 +1,166 @@
 import logging
-from sqlalchemy import create_engine
-from sqlalchemy_utils import database_exists, create_database
-from .db_tables import Listing, Message
+from sqlalchemy import create_engine, event, inspect, text
+from . import db_queries
+from .db_tables import Base, Listing, Message
 
 
 logger = logging.getLogger(__name__)
 
+# Applied to every new SQLite connection. WAL journal mode is persistent, so is set once in validate_database
+SQLITE_CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -32000,
+    "mmap_size": 268435456,
+    "busy_timeout": 5000,
+}
+
+
+def set_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    for pragma_name, pragma_value in SQLITE_CONNECTION_PRAGMAS.items():
+        cursor.execute("PRAGMA %s = %s" % (pragma_name, pragma_value))
+    cursor.close()
+
+
+def register_sqlite_pragmas(engine):
+    """
+    Apply connection pragmas to every connection an SQLite engine opens
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    if not event.contains(engine, "connect", set_sqlite_pragmas):
+        event.listen(engine, "connect", set_sqlite_pragmas)
+
+
+def enable_wal(engine):
+    """
+    Switch an SQLite database to write ahead logging, letting readers run alongside the upserting writer
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode = WAL").scalar()
+    logger.info("SQLite journal mode: %s" % journal_mode)
+
+
+def rebuild_primary_key(conn, table, existing_cols: set):
+    """
+    Move a table onto its current primary key. SQLite cannot alter a primary key in place,
+    so the table is recreated and its rows copied across
+    """
+    pk_col_names = [x.name for x in table.primary_key.columns]
+    if conn.dialect.name != "sqlite":
+        pk_name = inspect(conn).get_pk_constraint(table.name)["name"]
+        conn.execute(text("ALTER TABLE %s DROP CONSTRAINT %s" % (table.name, pk_name)))
+        conn.execute(
+            text(
+                "ALTER TABLE %s ADD PRIMARY KEY (%s)"
+                % (table.name, ", ".join(pk_col_names))
+            )
+        )
+        return
+
+    old_table_name = "%s_old" % table.name
+    conn.execute(text("ALTER TABLE %s RENAME TO %s" % (table.name, old_table_name)))
+    # Indexes keep their names through the rename, so are dropped before the new table recreates them
+    for index in inspect(conn).get_indexes(old_table_name):
+        conn.execute(text("DROP INDEX %s" % index["name"]))
+    table.create(conn)
+    copy_cols = ", ".join(
+        x.name for x in table.columns if x.name in existing_cols and x.computed is None
+    )
+    conn.execute(
+        text(
+            "INSERT INTO %s (%s) SELECT %s FROM %s"
+            % (table.name, copy_cols, copy_cols, old_table_name)
+        )
+    )
+    conn.execute(text("DROP TABLE %s" % old_table_name))
+
+
+def migrate_database(engine):
+    """
+    Create missing tables, and bring existing tables up to date with new primary keys, columns and indexes
+    """
+    Base.metadata.create_all(engine)
+    db_inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_cols = {x["name"] for x in db_inspector.get_columns(table.name)}
+            existing_pk_cols = db_inspector.get_pk_constraint(table.name)[
+                "constrained_columns"
+            ]
+            if set(existing_pk_cols) != {x.name for x in table.primary_key.columns}:
+                rebuild_primary_key(conn, table, existing_cols)
+                logger.info("Rebuilt %s primary key" % table.name)
+                # Recreated tables already have every column and index
+                if conn.dialect.name == "sqlite":
+                    continue
+            for col in table.columns:
+                if col.name in existing_cols:
+                    continue
+                col_ddl = "%s %s" % (col.name, col.type.compile(dialect=engine.dialect))
+                if col.computed is not None:
+                    # SQLite can only add virtual generated columns to an existing table
+                    generated_kind = (
+                        "VIRTUAL" if engine.dialect.name == "sqlite" else "STORED"
+                    )
+                    col_ddl += " GENERATED ALWAYS AS (%s) %s" % (
+                        col.computed.sqltext,
+                        generated_kind,
+                    )
+                conn.execute(
+                    text("ALTER TABLE %s ADD COLUMN %s" % (table.name, col_ddl))
+                )
+                logger.info("Added column %s.%s" % (table.name, col.name))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+
+
+def explain_query_plan(engine, query_sql: str, query_params: list):
+    """
+    SQLite's query plan for a query, one detail string per plan step
+    """
+    with engine.connect() as conn:
+        plan_rows = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN %s" % query_sql, tuple(query_params)
+        ).fetchall()
+
+    return [x[-1] for x in plan_rows]
+
+
+def check_mail_query_plan(engine):
+    """
+    Check the mail query searches listings through an index rather than scanning the table.
+    Returns None for databases other than SQLite
+    """
+    if engine.dialect.name != "sqlite":
+        return None
+    new_listings_sql, area_params = db_queries.new_listings_query()
+    plan_details = explain_query_plan(
+        engine, new_listings_sql, ["1970-01-01 00:00:00"] + area_params
+    )
+    for plan_detail in plan_details:
+        logger.info("Mail query plan: %s" % plan_detail)
+    is_full_scan = any(x.startswith("SCAN") and "listings" in x for x in plan_details)
+    uses_index = any("USING" in x and "INDEX" in x for x in plan_details)
+    if is_full_scan or not uses_index:
+        logger.warning("Mail query does not use a listings index")
+        return False
+
+    return True
+
 
 def validate_database(db_file_path: str = "sqlite:///db/listings.db"):
+    """
+    Create or migrate the database, its tables and indexes, then enable WAL and check the mail query plan
+    """
+    # sqlalchemy_utils is slow to import and only needed here
+    from sqlalchemy_utils import database_exists, create_database
+
     engine = create_engine(db_file_path)
+    register_sqlite_pragmas(engine)
     if not database_exists(engine.url):
         create_database(engine.url)
         Listing.metadata.create_all(engine)
@@ -16,7 +168,16 @@ def validate_database(db_file_path: str = "sqlite:///db/listings.db"):
         logger.info("Created new database: %s" % db_file_path)
     else:
         logger.info("Database %s already exists" % db_file_path)
+        migrate_database(engine)
+
+    enable_wal(engine)
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA optimize")
+    check_mail_query_plan(engine)
+    engine.dispose()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     validate_database()
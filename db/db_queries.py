@@ -0,0 +1,64 @@
+MAIL_POSTAL4_CODES = [
+    "2311",
+    "2312",
+    "2313",
+    "2314",
+    "2315",
+    "2316",
+    "2317",
+    "2318",
+    "2321",
+    "2322",
+    "2323",
+    "2324",
+    "2331",
+    "2332",
+    "2333",
+    "2334",
+]
+# Domains whose listings are mailed regardless of postal area
+MAIL_ALL_AREA_DOMAINS = ["https://kamernet.nl"]
+
+
+def new_listings_query(
+    postal4_codes: list = MAIL_POSTAL4_CODES,
+    all_area_domains: list = MAIL_ALL_AREA_DOMAINS,
+):
+    """
+    Parameterised query for listings uploaded after a date, either in one of the postal areas or from an all area domain.
+    Returns the SQL and its parameters after the leading upload date
+    """
+    postal4_placeholders = ", ".join("?" for _ in postal4_codes)
+    domain_placeholders = ", ".join("?" for _ in all_area_domains)
+    new_listings_sql = """
+        SELECT url_append, property_id, upload_date, publish_date, domain, postal_code,
+            street, house_number, house_addition, locale, rent_total, area_dwelling
+        FROM listings
+        WHERE upload_date > ?
+        AND (postal4 IN (%s)
+            OR domain IN (%s))
+    """ % (
+        postal4_placeholders,
+        domain_placeholders,
+    )
+
+    return new_listings_sql, list(postal4_codes) + list(all_area_domains)
+
+
+def price_drops_query():
+    """
+    Parameterised query for rent decreases observed after a date, served by the
+    listing_history (field_name, observed_at) index. Returns the SQL, its only parameter is the date
+    """
+    price_drops_sql = """
+        SELECT url_append, observed_at,
+            CAST(old_value AS REAL) AS old_rent_total,
+            CAST(new_value AS REAL) AS new_rent_total
+        FROM listing_history
+        WHERE field_name = 'rent_total'
+        AND observed_at > ?
+        AND CAST(new_value AS REAL) < CAST(old_value AS REAL)
+        ORDER BY observed_at DESC
+    """
+
+    return price_drops_sql
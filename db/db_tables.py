@@ -1,4 +1,5 @@
 from typing import Optional
+from sqlalchemy import Computed, Index
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
@@ -12,10 +13,21 @@ class Listing(Base):
     __tablename__ = "listings"
 
     url_append: Mapped[str] = mapped_column(primary_key=True)
-    upload_date: Mapped[str]
-    domain: Mapped[str]
+    # When the listing's content was last inserted or changed
+    upload_date: Mapped[str] = mapped_column(index=True)
+    last_seen_date: Mapped[Optional[str]]
+    # When the full record was last fetched and compared, changed or not
+    checked_date: Mapped[Optional[str]]
+    content_hash: Mapped[Optional[str]]
+    # Shared by listings of the same home across sources, see dedup.property_matching
+    property_id: Mapped[Optional[str]] = mapped_column(index=True)
+    domain: Mapped[str] = mapped_column(index=True)
     domain_id: Mapped[str]
     postal_code: Mapped[Optional[str]]
+    # Postal area, derived by the DB so the mail query's area filter can use an index
+    postal4: Mapped[Optional[str]] = mapped_column(
+        Computed("substr(postal_code, 1, 4)", persisted=True), index=True
+    )
     street: Mapped[str]
     house_number: Mapped[Optional[int]]
     house_addition: Mapped[Optional[str]]
@@ -54,11 +66,53 @@ class Listing(Base):
         return fmt_str
 
 
+class ListingHistory(Base):
+    __tablename__ = "listing_history"
+    __table_args__ = (
+        Index("ix_listing_history_field_name_observed_at", "field_name", "observed_at"),
+    )
+
+    url_append: Mapped[str] = mapped_column(primary_key=True)
+    observed_at: Mapped[str] = mapped_column(primary_key=True)
+    field_name: Mapped[str] = mapped_column(primary_key=True)
+    old_value: Mapped[Optional[str]]
+    new_value: Mapped[Optional[str]]
+
+
 class Message(Base):
     __tablename__ = "message"
 
     sent_url_append: Mapped[str] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column(primary_key=True)
     sender: Mapped[str]
-    recipient: Mapped[str]
     send_date: Mapped[str]
-    sent_data_upload_date: Mapped[str]
+    sent_data_upload_date: Mapped[str] = mapped_column(index=True)
+
+
+class Run(Base):
+    __tablename__ = "runs"
+
+    run_id: Mapped[str] = mapped_column(primary_key=True)
+    archive_run_id: Mapped[Optional[str]]
+    mode: Mapped[str]
+    status: Mapped[str]
+    started_at: Mapped[str]
+    finished_at: Mapped[str]
+    duration_sec: Mapped[float]
+    n_records: Mapped[int]
+    n_inserted: Mapped[Optional[int]]
+    n_updated: Mapped[Optional[int]]
+    n_unchanged: Mapped[Optional[int]]
+
+
+class RunStage(Base):
+    __tablename__ = "run_stages"
+
+    run_id: Mapped[str] = mapped_column(primary_key=True)
+    source: Mapped[str] = mapped_column(primary_key=True)
+    stage: Mapped[str] = mapped_column(primary_key=True)
+    count: Mapped[int]
+    errors: Mapped[int]
+    records: Mapped[int]
+    total_sec: Mapped[float]
+    max_sec: Mapped[float]
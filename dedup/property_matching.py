@@ -0,0 +1,272 @@
+from db.db_tables import Listing
+import logging
+import re
+from sqlalchemy import bindparam, select, update
+import unicodedata
+
+
+logger = logging.getLogger(__name__)
+
+POSTAL_CODE_PATTERN = re.compile(r"^(\d{4})\s*([a-z]{2})$")
+HOUSE_NUMBER_PATTERN = re.compile(r"^(\d+)(.*)$")
+NON_ALNUM_PATTERN = re.compile(r"[^0-9a-z]+")
+# Largest relative difference of a field for two listings to still be the same home
+MATCH_TOLERANCES = {"area_dwelling": 0.1, "rent_total": 0.1}
+
+
+def normalise_text(text):
+    """
+    Lower case ASCII with accents dropped and separators collapsed to single dashes,
+    matching the URL slugs some sources store as addresses
+    """
+    if text is None:
+        return None
+    ascii_text = (
+        unicodedata.normalize("NFKD", str(text))
+        .encode("ascii", "ignore")
+        .decode()
+        .lower()
+    )
+
+    return NON_ALNUM_PATTERN.sub("-", ascii_text).strip("-") or None
+
+
+def normalise_postal_code(postal_code):
+    """
+    Dutch postal code as 1234ab, or None when missing or malformed
+    """
+    if postal_code is None:
+        return None
+    postal_code_match = POSTAL_CODE_PATTERN.match(str(postal_code).strip().lower())
+    if postal_code_match is None:
+        return None
+
+    return postal_code_match.group(1) + postal_code_match.group(2)
+
+
+def normalise_house_number(house_number, house_addition):
+    """
+    Integer house number and addition, taking a suffix of the number (12A, 12-2) as the addition when none is given
+    """
+    if isinstance(house_number, float):
+        house_number = int(house_number)
+    number = None
+    number_suffix = None
+    if house_number is not None:
+        house_number_match = HOUSE_NUMBER_PATTERN.match(str(house_number).strip())
+        if house_number_match is not None:
+            number = int(house_number_match.group(1))
+            number_suffix = house_number_match.group(2)
+    addition = normalise_text(house_addition) or normalise_text(number_suffix)
+
+    return number, addition
+
+
+def address_block_key(row):
+    """
+    Block on postal code, or locale and street when the postal code is missing.
+    Returns None when the address is too incomplete to compare
+    """
+    postal_code = normalise_postal_code(row["postal_code"])
+    if postal_code is not None:
+        return postal_code
+    street = normalise_text(row["street"])
+    locale = normalise_text(row["locale"])
+    if street is None or locale is None:
+        return None
+
+    return "%s-%s" % (locale, street)
+
+
+def normalise_measure(value):
+    """
+    Positive float, or None when missing, e.g. the -1 rent of price on request listings
+    """
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    return value if value > 0 else None
+
+
+def property_candidate(row):
+    """
+    Normalised fields of a listing compared when matching it against others in its block
+    """
+    number, addition = normalise_house_number(
+        row["house_number"], row["house_addition"]
+    )
+
+    return {
+        "url_append": row["url_append"],
+        "domain": row["domain"],
+        "street": normalise_text(row["street"]),
+        "number": number,
+        "addition": addition,
+        "area_dwelling": normalise_measure(row["area_dwelling"]),
+        "rent_total": normalise_measure(row["rent_total"]),
+    }
+
+
+def relative_difference(x_value, y_value):
+    return abs(x_value - y_value) / max(x_value, y_value)
+
+
+def match_distance(x, y):
+    """
+    Summed relative area and rent difference of two listings in one block if they can be the same home,
+    otherwise None. Listings of one domain never match. Both need a house number, with any additions agreeing,
+    or else the same street and a known area and rent, which must agree within tolerance whenever both are known
+    """
+    if x["domain"] == y["domain"]:
+        return None
+    has_numbers = x["number"] is not None and y["number"] is not None
+    if has_numbers:
+        if x["number"] != y["number"]:
+            return None
+        if (
+            x["addition"] is not None
+            and y["addition"] is not None
+            and x["addition"] != y["addition"]
+        ):
+            return None
+    elif x["street"] is None or x["street"] != y["street"]:
+        return None
+
+    distance = 0.0
+    for col_name, tolerance in MATCH_TOLERANCES.items():
+        if x[col_name] is None or y[col_name] is None:
+            if not has_numbers:
+                return None
+            continue
+        col_difference = relative_difference(x[col_name], y[col_name])
+        if col_difference > tolerance:
+            return None
+        distance += col_difference
+
+    return distance
+
+
+def block_match_pairs(candidates: list):
+    """
+    Pairs of matching listings in a block, closest first. Listings with a house number are only compared
+    to those with the same number or none
+    """
+    number_groups = {}
+    for x in candidates:
+        number_groups.setdefault(x["number"], []).append(x)
+    unnumbered = number_groups.pop(None, [])
+
+    match_pairs = []
+    for group in list(number_groups.values()) + [unnumbered]:
+        for i, x in enumerate(group):
+            for y in group[i + 1 :]:
+                distance = match_distance(x, y)
+                if distance is not None:
+                    match_pairs.append((distance, x["url_append"], y["url_append"]))
+    for x in unnumbered:
+        for y in candidates:
+            if y["number"] is None:
+                continue
+            distance = match_distance(x, y)
+            if distance is not None:
+                match_pairs.append((distance, x["url_append"], y["url_append"]))
+
+    return sorted(match_pairs)
+
+
+def assign_property_ids(rows):
+    """
+    Map each row's url_append to a canonical property_id. Rows are only compared within their address block,
+    matching pairs merging closest first as long as the merged property keeps one listing per domain and
+    one house addition. A property's id is its smallest url_append, so unmatched rows keep their own
+    """
+    blocks = {}
+    for row in rows:
+        block_key = address_block_key(row)
+        if block_key is not None:
+            blocks.setdefault(block_key, []).append(property_candidate(row))
+
+    # Union find over url_appends, each root tracking its property's domains and additions
+    parents = {x["url_append"]: x["url_append"] for x in rows}
+    domains = {x["url_append"]: {x["domain"]} for x in rows}
+    additions = {}
+    for candidates in blocks.values():
+        for x in candidates:
+            additions[x["url_append"]] = {x["addition"]} - {None}
+
+    def find_root(url_append):
+        while parents[url_append] != url_append:
+            parents[url_append] = parents[parents[url_append]]
+            url_append = parents[url_append]
+        return url_append
+
+    for candidates in blocks.values():
+        for _, x_url_append, y_url_append in block_match_pairs(candidates):
+            x_root = find_root(x_url_append)
+            y_root = find_root(y_url_append)
+            if x_root == y_root:
+                continue
+            if domains[x_root] & domains[y_root]:
+                continue
+            if len(additions[x_root] | additions[y_root]) > 1:
+                continue
+            parents[y_root] = x_root
+            domains[x_root] |= domains.pop(y_root)
+            additions[x_root] |= additions.pop(y_root)
+
+    property_members = {}
+    for url_append in parents:
+        property_members.setdefault(find_root(url_append), []).append(url_append)
+    property_ids = {}
+    for url_appends in property_members.values():
+        property_id = min(url_appends)
+        for url_append in url_appends:
+            property_ids[url_append] = property_id
+
+    return property_ids
+
+
+def resolve_property_ids(engine):
+    """
+    Assign property_id across every stored listing, so the same home listed on several sources shares one.
+    Only listings whose property_id changed are written. Returns the number written
+    """
+    address_stmt = select(
+        Listing.url_append,
+        Listing.postal_code,
+        Listing.house_number,
+        Listing.house_addition,
+        Listing.street,
+        Listing.locale,
+        Listing.domain,
+        Listing.area_dwelling,
+        Listing.rent_total,
+        Listing.property_id,
+    )
+    with engine.begin() as conn:
+        address_rows = conn.execute(address_stmt).mappings().all()
+        property_ids = assign_property_ids(address_rows)
+        changed_rows = [
+            {
+                "resolved_url_append": x["url_append"],
+                "resolved_property_id": property_ids[x["url_append"]],
+            }
+            for x in address_rows
+            if x["property_id"] != property_ids[x["url_append"]]
+        ]
+        if len(changed_rows) > 0:
+            resolve_stmt = (
+                update(Listing)
+                .where(Listing.url_append == bindparam("resolved_url_append"))
+                .values(property_id=bindparam("resolved_property_id"))
+            )
+            conn.execute(resolve_stmt, changed_rows)
+
+    logger.info(
+        "Resolved %s listings to %s properties, %s property ids changed"
+        % (len(address_rows), len(set(property_ids.values())), len(changed_rows))
+    )
+
+    return len(changed_rows)
@@ -1,28 +1,41 @@
 from datetime import datetime
+from db import db_queries
+from db.db_init import set_sqlite_pragmas
 from db.db_tables import Message
 import jinja2
 import logging
 from mail.email_utils import EmailSender
 import os
-import pandas as pd
 import sqlite3
-from utils import push_to_db
+from utils import insert_to_db
 
 
 logger = logging.getLogger(__name__)
 
 
 class MailGenerator:
-    def __init__(self, db_url: str = "db/listings.db"):
+    def __init__(
+        self,
+        db_url: str = "db/listings.db",
+        recipient_file_path: str = "recipients.txt",
+        lookup_chunk_size: int = 500,
+    ):
+        self.db_url = db_url
+        self.lookup_chunk_size = lookup_chunk_size
+        self.recipient_list = self.retrieve_recipients(recipient_file_path)
         self.conn = sqlite3.connect(db_url)
+        self.conn.row_factory = sqlite3.Row
+        set_sqlite_pragmas(self.conn, None)
+        # Property key to the recipients who have not yet been sent any of its listings
+        self.unsent_recipients = {}
+        # Newest upload date of the new listings, the watermark logged with the mail
+        self.max_new_upload_date = None
         self.max_prior_send_date = self.retrieve_max_prior_send()
         self.new_listings = self.retrieve_new_listings(
             max_send_date=self.max_prior_send_date
         )
         self.send_date_raw = datetime.now()
         self.send_date = self.send_date_raw.strftime("%Y-%m-%d %H:%M:00")
-        self.template_prepped_listings = self.format_listing_data()
-        self.rendered_email_template = self.render_template()
 
     def retrieve_max_prior_send(self):
         """
@@ -32,11 +45,11 @@ class MailGenerator:
             SELECT MAX(sent_data_upload_date)
             FROM message
         """
-        sent_message_max_date_df = pd.read_sql_query(sent_message_query, self.conn)
-        if sent_message_max_date_df.iloc[0, 0] is None:
+        sent_message_max_date_raw = self.conn.execute(sent_message_query).fetchone()[0]
+        if sent_message_max_date_raw is None:
             sent_message_max_date_str = datetime(1970, 1, 1)
         else:
-            sent_message_max_date_str = sent_message_max_date_df.iloc[0, 0]
+            sent_message_max_date_str = sent_message_max_date_raw
 
         return sent_message_max_date_str
 
@@ -44,45 +57,102 @@ class MailGenerator:
         """
         Pull listings found after that timestamp
         """
-        leiden_postal_codes = [
-            "2311",
-            "2312",
-            "2313",
-            "2314",
-            "2315",
-            "2316",
-            "2317",
-            "2318",
-            "2321",
-            "2322",
-            "2323",
-            "2324",
-            "2331",
-            "2332",
-            "2333",
-            "2334",
-        ]
-        leiden_postal_codes_str = "'" + "','".join(leiden_postal_codes) + "'"
-        new_listings_query = """
-            SELECT url_append, upload_date, publish_date, domain, postal_code, 
-                street, house_number, house_addition, locale, rent_total, area_dwelling
-            FROM listings
-            WHERE upload_date > '%s'
-            AND (SUBSTR(postal_code, 1, 4) IN (%s) 
-                OR domain = 'https://kamernet.nl')
-        """ % (
-            max_send_date,
-            leiden_postal_codes_str,
-        )
-        new_listings = pd.read_sql_query(new_listings_query, self.conn)
-        if new_listings.empty:
+        new_listings_query, area_params = db_queries.new_listings_query()
+        new_listings = self.conn.execute(
+            new_listings_query, [str(max_send_date)] + area_params
+        ).fetchall()
+
+        # One listing per home however many sources list it, keeping homes only for recipients who have not had them,
+        # including listings updated since being mailed, which come back with a new upload date
+        unique_listings = {}
+        for x in new_listings:
+            unique_listings.setdefault(self.property_key(x), x)
+        sent_recipients = self.retrieve_sent_recipients(list(unique_listings))
+        recipient_set = set(self.recipient_list)
+        new_listings = []
+        for property_key, x in unique_listings.items():
+            unsent_recipients = recipient_set - sent_recipients.get(property_key, set())
+            if len(unsent_recipients) > 0:
+                new_listings.append(x)
+                self.unsent_recipients[property_key] = unsent_recipients
+                if (
+                    self.max_new_upload_date is None
+                    or x["upload_date"] > self.max_new_upload_date
+                ):
+                    self.max_new_upload_date = x["upload_date"]
+        if len(new_listings) == 0:
             # Need to add in exit with no email thing
             return None
         return new_listings
 
-    def format_listing_data(self):
+    @staticmethod
+    def property_key(listing):
+        """
+        Listings not yet resolved to a property stand for themselves
+        """
+        return listing["property_id"] or listing["url_append"]
+
+    def retrieve_sent_recipients(self, property_keys: list):
+        """
+        Map each of the property keys to the recipients any of its listings was already sent to. Keys are matched
+        on the listings property_id index, or primary key for listings not yet resolved to a property, keying the
+        result by the same expression as property_key
+        """
+        sent_recipients = {}
+        if len(self.recipient_list) == 0:
+            return sent_recipients
+
+        recipient_placeholders = ", ".join("?" for _ in self.recipient_list)
+        for chunk_start in range(0, len(property_keys), self.lookup_chunk_size):
+            chunk = property_keys[chunk_start : chunk_start + self.lookup_chunk_size]
+            chunk_placeholders = ", ".join("?" for _ in chunk)
+            sent_query = """
+                SELECT COALESCE(listings.property_id, listings.url_append), message.recipient
+                FROM listings
+                JOIN message ON message.sent_url_append = listings.url_append
+                WHERE (listings.property_id IN (%s) OR listings.url_append IN (%s))
+                AND message.recipient IN (%s)
+            """ % (
+                chunk_placeholders,
+                chunk_placeholders,
+                recipient_placeholders,
+            )
+            for property_key, recipient in self.conn.execute(
+                sent_query, chunk + chunk + self.recipient_list
+            ):
+                sent_recipients.setdefault(property_key, set()).add(recipient)
+
+        return sent_recipients
+
+    def recipient_batches(self):
+        """
+        Group recipients by the new listings they have not had, so each group is mailed only those.
+        Walks the new listings once, collecting each recipient's listings and their url_appends.
+        Returns a list of (recipients, listings, url_appends)
+        """
+        recipient_listings = {}
+        for x in self.new_listings:
+            for recipient in self.unsent_recipients[self.property_key(x)]:
+                listings, url_appends = recipient_listings.setdefault(
+                    recipient, ([], [])
+                )
+                listings.append(x)
+                url_appends.append(x["url_append"])
+
+        recipient_batches = {}
+        for recipient in self.recipient_list:
+            if recipient not in recipient_listings:
+                continue
+            listings, url_appends = recipient_listings[recipient]
+            recipient_batches.setdefault(
+                tuple(url_appends), ([], listings, url_appends)
+            )[0].append(recipient)
+
+        return list(recipient_batches.values())
+
+    def format_listing_data(self, listings: list = None):
         """
-        Format into jinja friendly data
+        Format listings, all new listings by default, into jinja friendly data
         """
         listing_list = []
         zebra_striped_row_color = "#e6e9f1"
@@ -95,9 +165,12 @@ class MailGenerator:
             "https://www.funda.nl": "/en/koop/leiden",
         }
 
-        all_sent_url_appends = []
+        if listings is None:
+            listings = self.new_listings
+        if listings is None:
+            return listing_list
 
-        for _, r in self.new_listings.iterrows():
+        for r in listings:
             listing_dict = {}
 
             domain_specific_url_path = domain_specific_url_dict[r["domain"]]
@@ -111,7 +184,6 @@ class MailGenerator:
             else:
                 listing_url = r["domain"] + domain_specific_url_path + r["url_append"]
             listing_dict["url"] = listing_url
-            all_sent_url_appends.append(r["url_append"])
 
             street = r["street"].replace("-", " ").capitalize()
             house_number = r["house_number"] if r["house_number"] is not None else ""
@@ -160,11 +232,12 @@ class MailGenerator:
 
     def render_template(
         self,
+        listing_list: list,
         email_template_dir: str = "static/",
         email_template_file: str = "email_template.html",
     ):
         """
-        Load template assets
+        Load template assets and render the formatted listings
         """
         template_loader = jinja2.FileSystemLoader(searchpath=email_template_dir)
         template_env = jinja2.Environment(loader=template_loader)
@@ -172,74 +245,78 @@ class MailGenerator:
         rendered_template = email_template.render(
             send_date=self.send_date,
             last_send_date=self.max_prior_send_date,
-            listing_list=self.template_prepped_listings,
+            listing_list=listing_list,
         )
 
         return rendered_template
 
     def retrieve_recipients(self, recipient_file_path: str = "recipients.txt"):
         """
-        Pull recipient list
+        Pull recipient list, skipping blank lines
         """
         recipients_file = open(recipient_file_path, "r")
         recipients_text = recipients_file.read()
-        recipient_list = recipients_text.split("\n")
+        recipient_list = [x.strip() for x in recipients_text.split("\n") if x.strip()]
         recipients_file.close()
 
         return recipient_list
 
     def execute_mail(self, rendered_template=None):
         """
-        Mail out listings
+        Mail out listings, each group of recipients only those it has not had.
+        A rendered_template given is sent to every recipient as the mail for all new listings
         """
-        recipient_list = self.retrieve_recipients()
-        if rendered_template is None:
-            rendered_template = self.rendered_email_template
+        if rendered_template is not None:
+            mail_batches = [
+                (
+                    self.recipient_list,
+                    [x["url_append"] for x in self.new_listings],
+                    rendered_template,
+                )
+            ]
+        else:
+            mail_batches = [
+                (x, z, self.render_template(self.format_listing_data(y)))
+                for x, y, z in self.recipient_batches()
+            ]
         title_str = "House Search Email for %s" % self.send_date
         e = EmailSender()
-        e.send_mail(
-            message=rendered_template, recipients=recipient_list, mail_title=title_str
-        )
+        for recipient_list, sent_url_appends, batch_template in mail_batches:
+            e.send_mail(
+                message=batch_template, recipients=recipient_list, mail_title=title_str
+            )
+            self.push_logs_to_db(recipient_list, self.send_date_raw, sent_url_appends)
 
         logger.info("Emails sent succesfully.")
 
-        self.push_logs_to_db(recipient_list, self.send_date_raw)
-
     def push_logs_to_db(
         self,
         recipient_list: list,
         send_date_raw,
+        sent_url_appends: list,
         app_user_email_key: str = "GMAIL_USER_EMAIL",
     ):
         """
-        Update message table with newest sent data
+        Log every listing sent to every recipient in one bulk insert, keeping pairs already logged.
+        The watermark is the newest upload date of all new listings, as the query returns them unordered
         """
-        sent_data_upload_date_raw = self.new_listings["upload_date"][0]
         sent_data_upload_date = datetime.strptime(
-            sent_data_upload_date_raw, "%Y-%m-%d %H:%M:00"
+            self.max_new_upload_date, "%Y-%m-%d %H:%M:00"
         )
 
-        all_sent_url_appends = [
-            r["url_append"] for _, r in self.new_listings.iterrows()
-        ]
+        sender = os.environ.get(app_user_email_key)
         message_table_data = [
-            {"recipient": x, "sent_url_append": y}
-            for y in all_sent_url_appends
+            {
+                "sent_url_append": y,
+                "recipient": x,
+                "sender": sender,
+                "send_date": send_date_raw,
+                "sent_data_upload_date": sent_data_upload_date,
+            }
+            for y in sent_url_appends
             for x in recipient_list
         ]
-        [
-            x.update({"sender": os.environ.get(app_user_email_key)})
-            for x in message_table_data
-        ]
-        [x.update({"send_date": send_date_raw}) for x in message_table_data]
-        [
-            x.update({"sent_data_upload_date": sent_data_upload_date})
-            for x in message_table_data
-        ]
 
-        push_to_db(
-            message_table_data,
-            push_data_pk="sent_url_append",
-            table=Message,
-            table_pk=Message.sent_url_append,
+        insert_to_db(
+            message_table_data, table=Message, db_url="sqlite:///%s" % self.db_url
         )
@@ -0,0 +1,219 @@
+from contextlib import contextmanager
+from db.db_tables import Run, RunStage
+import logging
+import os
+from sqlalchemy import insert
+import threading
+from time import perf_counter
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+STAGE_METRICS = {}
+STAGE_METRICS_LOCK = threading.Lock()
+# Domain to source name, so metrics recorded from a URL are labelled by source
+SOURCE_LABELS = {}
+
+
+def register_sources(source_urls: dict):
+    """
+    Label metrics recorded against any of a source's URLs with the source name
+    """
+    for source_name, urls in source_urls.items():
+        for url in urls:
+            SOURCE_LABELS[urlparse(url).netloc] = source_name
+
+
+def source_label(url: str):
+    """
+    Source name for a URL or bare domain, falling back to the domain itself
+    """
+    domain = urlparse(url).netloc or url
+
+    return SOURCE_LABELS.get(domain, domain)
+
+
+def empty_stage_stats():
+    return {"count": 0, "errors": 0, "records": 0, "total_sec": 0.0, "max_sec": 0.0}
+
+
+def record_stage(
+    source: str,
+    stage: str,
+    duration: float,
+    is_error: bool = False,
+    n_records: int = 0,
+    count: int = 1,
+):
+    """
+    Add count timed operations of a stage, totalling duration seconds, to the source's tally
+    """
+    with STAGE_METRICS_LOCK:
+        stage_stats = STAGE_METRICS.setdefault((source, stage), empty_stage_stats())
+        stage_stats["count"] += count
+        stage_stats["errors"] += int(is_error)
+        stage_stats["records"] += n_records
+        stage_stats["total_sec"] += duration
+        stage_stats["max_sec"] = max(stage_stats["max_sec"], duration)
+
+
+@contextmanager
+def stage_timer(source: str, stage: str):
+    """
+    Time the enclosed block as one operation of a stage, counting it as an error if it raises
+    """
+    stage_start = perf_counter()
+    try:
+        yield
+    except BaseException:
+        record_stage(source, stage, perf_counter() - stage_start, is_error=True)
+        raise
+    record_stage(source, stage, perf_counter() - stage_start)
+
+
+def get_stage_metrics():
+    """
+    Snapshot of stage stats keyed by (source, stage)
+    """
+    with STAGE_METRICS_LOCK:
+        return {k: dict(v) for k, v in STAGE_METRICS.items()}
+
+
+def merge_stage_metrics(stage_metrics: dict):
+    """
+    Fold a snapshot taken in a worker process into this process' stage stats
+    """
+    with STAGE_METRICS_LOCK:
+        for metric_key, worker_stats in stage_metrics.items():
+            stage_stats = STAGE_METRICS.setdefault(metric_key, empty_stage_stats())
+            for stat_name in ("count", "errors", "records", "total_sec"):
+                stage_stats[stat_name] += worker_stats[stat_name]
+            stage_stats["max_sec"] = max(
+                stage_stats["max_sec"], worker_stats["max_sec"]
+            )
+
+
+def reset_stage_metrics():
+    with STAGE_METRICS_LOCK:
+        STAGE_METRICS.clear()
+
+
+def prometheus_labels(labels: dict):
+    label_strs = [
+        '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+        for k, v in labels.items()
+    ]
+
+    return "{%s}" % ",".join(label_strs)
+
+
+STAGE_GAUGES = (
+    ("puller_stage_seconds", "total_sec", "Seconds spent in the stage"),
+    ("puller_stage_max_seconds", "max_sec", "Longest single operation of the stage"),
+    ("puller_stage_operations", "count", "Operations timed in the stage"),
+    ("puller_stage_errors", "errors", "Operations of the stage that failed"),
+    ("puller_stage_records", "records", "Records handled by the stage"),
+)
+
+
+def format_prometheus(run_summary: dict, stage_metrics: dict):
+    """
+    Render a run's summary and stage stats in the Prometheus text exposition format.
+    Every value describes the latest run, so all are gauges. The summary's run_labels, if any, are added to every series
+    """
+    run_labels = run_summary.get("run_labels", {})
+    lines = []
+    for metric_name, stat_name, help_str in STAGE_GAUGES:
+        lines.append("# HELP %s %s" % (metric_name, help_str))
+        lines.append("# TYPE %s gauge" % metric_name)
+        for (source, stage), stage_stats in sorted(stage_metrics.items()):
+            lines.append(
+                "%s%s %s"
+                % (
+                    metric_name,
+                    prometheus_labels(dict(run_labels, source=source, stage=stage)),
+                    stage_stats[stat_name],
+                )
+            )
+
+    run_gauges = (
+        ("puller_run_duration_seconds", "Wall time of the run", "duration_sec", {}),
+        (
+            "puller_run_finished_timestamp_seconds",
+            "Unix time the run finished",
+            "finished_timestamp",
+            {},
+        ),
+        (
+            "puller_run_success",
+            "Whether every source completed",
+            "success",
+            {"mode": run_summary["mode"]},
+        ),
+        ("puller_run_records", "Records pulled in the run", "n_records", {}),
+    )
+    for metric_name, help_str, summary_key, labels in run_gauges:
+        labels = dict(run_labels, **labels)
+        lines.append("# HELP %s %s" % (metric_name, help_str))
+        lines.append("# TYPE %s gauge" % metric_name)
+        lines.append(
+            "%s%s %s"
+            % (
+                metric_name,
+                prometheus_labels(labels) if labels else "",
+                run_summary[summary_key],
+            )
+        )
+
+    lines.append("# HELP puller_run_upserted_records Records upserted by result")
+    lines.append("# TYPE puller_run_upserted_records gauge")
+    for upsert_result, n_upserted in run_summary["upsert_counts"].items():
+        lines.append(
+            "puller_run_upserted_records%s %s"
+            % (prometheus_labels(dict(run_labels, result=upsert_result)), n_upserted)
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(
+    textfile_path: str, run_summary: dict, stage_metrics: dict
+):
+    """
+    Replace the textfile atomically so the collector never reads a partial write
+    """
+    textfile_dir = os.path.dirname(textfile_path)
+    if textfile_dir != "":
+        os.makedirs(textfile_dir, exist_ok=True)
+    tmp_textfile_path = "%s.%s.tmp" % (textfile_path, os.getpid())
+    with open(tmp_textfile_path, "w") as textfile:
+        textfile.write(format_prometheus(run_summary, stage_metrics))
+    os.replace(tmp_textfile_path, textfile_path)
+
+
+def store_run(engine, run_summary: dict, stage_metrics: dict):
+    """
+    Insert a run and its per source stage stats into the runs and run_stages tables
+    """
+    run_row = {
+        "run_id": run_summary["run_id"],
+        "archive_run_id": run_summary["archive_run_id"],
+        "mode": run_summary["mode"],
+        "status": run_summary["status"],
+        "started_at": run_summary["started_at"],
+        "finished_at": run_summary["finished_at"],
+        "duration_sec": run_summary["duration_sec"],
+        "n_records": run_summary["n_records"],
+        "n_inserted": run_summary["upsert_counts"].get("inserted"),
+        "n_updated": run_summary["upsert_counts"].get("updated"),
+        "n_unchanged": run_summary["upsert_counts"].get("unchanged"),
+    }
+    stage_rows = [
+        dict(run_id=run_summary["run_id"], source=source, stage=stage, **stage_stats)
+        for (source, stage), stage_stats in stage_metrics.items()
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Run), [run_row])
+        if len(stage_rows) > 0:
+            conn.execute(insert(RunStage), stage_rows)
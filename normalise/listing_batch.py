@@ -0,0 +1,245 @@
+from datetime import datetime
+import numpy as np
+
+
+TEXT_COLS = (
+    "street",
+    "locale",
+    "house_addition",
+    "district",
+    "corporation",
+    "dwelling_type",
+    "building_type",
+    "kitchen_format",
+)
+POSTAL_CODE_COLS = ("postal_code",)
+# Price on request listings keep the -1 rent Pararius has always stored, as rent_total is required
+PRICE_COLS = {
+    "rent_total": -1,
+    "rent_net": None,
+    "rent_calculation": None,
+    "service_costs": None,
+    "heating_costs": None,
+}
+DATE_COLS = ("available_date", "available_end_date", "publish_date", "closing_date")
+# Stripped from prices before reading their leading number
+PRICE_SYMBOLS = ("€", ",-")
+# Separators of a trailing one or two digit decimal part, or otherwise of thousands
+PRICE_SEPARATORS = (",", ".")
+ISO_DATETIME_LEN = 19
+# DD-MM-YYYY characters reordered into YYYY-MM-DD, the dashes staying in place
+DMY_TO_ISO_IDX = [6, 7, 8, 9, 2, 3, 4, 5, 0, 1]
+
+is_str_ufunc = np.frompyfunc(lambda x: isinstance(x, str), 1, 1)
+is_number_ufunc = np.frompyfunc(
+    lambda x: isinstance(x, (int, float)) and not isinstance(x, bool), 1, 1
+)
+
+
+class ListingBatch:
+    """
+    Columnar batch of listing records, one object array per column with a mask of the records carrying it,
+    so columns can be cleaned with array operations and records rebuilt with their original keys
+    """
+
+    def __init__(self, columns: dict, present: dict, n_records: int):
+        self.columns = columns
+        self.present = present
+        self.n_records = n_records
+
+    @classmethod
+    def from_records(cls, records: list):
+        n_records = len(records)
+        col_names = list(dict.fromkeys(k for x in records for k in x))
+        columns = {}
+        present = {}
+        for col_name in col_names:
+            # fromiter keeps sequence values, e.g. tuples, as single elements
+            columns[col_name] = np.fromiter(
+                (x.get(col_name) for x in records), dtype=object, count=n_records
+            )
+            present[col_name] = np.fromiter(
+                (col_name in x for x in records), dtype=bool, count=n_records
+            )
+
+        return cls(columns, present, n_records)
+
+    def to_records(self):
+        """
+        Rebuild records as dicts of plain Python values, leaving out columns a record did not carry
+        """
+        col_names = list(self.columns)
+        col_lists = [self.columns[x].tolist() for x in col_names]
+        present_lists = [self.present[x].tolist() for x in col_names]
+        records = []
+        for record_values, record_present in zip(zip(*col_lists), zip(*present_lists)):
+            records.append(
+                {
+                    k: v
+                    for k, v, is_present in zip(
+                        col_names, record_values, record_present
+                    )
+                    if is_present
+                }
+            )
+
+        return records
+
+    def str_mask(self, col_name: str):
+        return is_str_ufunc(self.columns[col_name]).astype(bool)
+
+    def map_strings(self, col_name: str, str_func):
+        """
+        Replace the column's string values with str_func of them as a unicode array, other values are kept
+        """
+        if col_name not in self.columns:
+            return
+        str_mask = self.str_mask(col_name)
+        if not str_mask.any():
+            return
+        str_values = self.columns[col_name][str_mask].astype(str)
+        self.columns[col_name][str_mask] = str_func(str_values).tolist()
+
+    def fill(self, col_name: str, value):
+        """
+        Set a column to one value for every record
+        """
+        col_values = np.empty(self.n_records, dtype=object)
+        col_values.fill(value)
+        self.columns[col_name] = col_values
+        self.present[col_name] = np.ones(self.n_records, dtype=bool)
+
+
+def collapse_whitespace(str_values):
+    """
+    Strip strings and collapse inner runs of whitespace to single spaces
+    """
+    for whitespace_char in ("\t", "\n", "\r", "\xa0"):
+        str_values = np.char.replace(str_values, whitespace_char, " ")
+    str_values = np.char.strip(str_values)
+    while (np.char.find(str_values, "  ") >= 0).any():
+        str_values = np.char.replace(str_values, "  ", " ")
+
+    return str_values
+
+
+def clean_postal_codes(str_values):
+    """
+    Upper case postal codes without spaces, cut to the code where one leads the string, e.g. 2311 ab or
+    2311 AB Leiden to 2311AB
+    """
+    str_values = np.char.replace(np.char.upper(np.char.strip(str_values)), " ", "")
+    code_values = str_values.astype("U6")
+    is_code = np.char.isdigit(code_values.astype("U4")) & np.char.isalpha(
+        np.char.lstrip(code_values, "0123456789")
+    )
+    is_code &= np.char.str_len(np.char.lstrip(code_values, "0123456789")) == 2
+
+    return np.where(is_code, code_values, str_values)
+
+
+def drop_decimal_parts(str_values):
+    """
+    Cut a trailing decimal part of one or two digits after the last separator, e.g. 1.250,50 or 1,250.5 to
+    1.250 and 1,250. Three digits after a separator are thousands, so 1.250 is kept
+    """
+    is_cut = np.zeros(len(str_values), dtype=bool)
+    for separator in PRICE_SEPARATORS:
+        heads, separators, tails = np.rollaxis(
+            np.char.rpartition(str_values, separator), 1
+        )
+        tail_lens = np.char.str_len(tails)
+        is_decimal = (
+            ~is_cut
+            & (separators != "")
+            & (tail_lens >= 1)
+            & (tail_lens <= 2)
+            & np.char.isdigit(tails)
+        )
+        str_values = np.where(is_decimal, heads, str_values)
+        is_cut |= is_decimal
+
+    return str_values
+
+
+def coerce_prices(col_values, missing_value=None):
+    """
+    Read prices as floats, taking the leading number of price strings once currency signs, any decimal part and
+    thousands separators are dropped, e.g. "€1,250.50 per month", "€ 1.250,50 per maand" or "€ 1.250,- /mnd" to 1250.
+    Values with no number become missing_value
+    """
+    str_mask = is_str_ufunc(col_values).astype(bool)
+    num_mask = is_number_ufunc(col_values).astype(bool)
+    prices = np.full(len(col_values), np.nan)
+    prices[num_mask] = col_values[num_mask].astype(float)
+    if str_mask.any():
+        str_values = col_values[str_mask].astype(str)
+        for price_symbol in PRICE_SYMBOLS:
+            str_values = np.char.replace(str_values, price_symbol, "")
+        leading_tokens = np.char.partition(collapse_whitespace(str_values), " ")[:, 0]
+        leading_tokens = drop_decimal_parts(leading_tokens)
+        for separator in PRICE_SEPARATORS:
+            leading_tokens = np.char.replace(leading_tokens, separator, "")
+        is_number = np.char.isdigit(leading_tokens)
+        str_prices = np.full(len(str_values), np.nan)
+        str_prices[is_number] = leading_tokens[is_number].astype(float)
+        prices[str_mask] = str_prices
+
+    coerced = prices.astype(object)
+    coerced[np.isnan(prices)] = missing_value
+
+    return coerced
+
+
+def parse_dates(str_values):
+    """
+    Parse ISO (YYYY-MM-DD, optionally with a time) and DD-MM-YYYY date strings, ignoring any time zone,
+    into datetimes. Strings in neither format are kept as they are
+    """
+    iso_values = str_values.astype("U%s" % ISO_DATETIME_LEN)
+    iso_chars = iso_values.view("U1").reshape(-1, ISO_DATETIME_LEN).copy()
+    is_iso = (iso_chars[:, 4] == "-") & (iso_chars[:, 7] == "-")
+    is_dmy = (iso_chars[:, 2] == "-") & (iso_chars[:, 5] == "-")
+    iso_chars[is_dmy, :10] = iso_chars[is_dmy][:, DMY_TO_ISO_IDX]
+    iso_chars[is_dmy, 10:] = ""
+    iso_values = iso_chars.view("U%s" % ISO_DATETIME_LEN).ravel()
+
+    is_date = is_iso | is_dmy
+    parsed = str_values.astype(object)
+    try:
+        parsed[is_date] = (
+            iso_values[is_date].astype("datetime64[s]").astype(object).tolist()
+        )
+    except ValueError:
+        # A malformed date fails the whole array, so fall back to parsing one by one
+        for i in np.flatnonzero(is_date):
+            try:
+                parsed[i] = datetime.fromisoformat(iso_values[i])
+            except ValueError:
+                pass
+
+    return parsed
+
+
+def normalise_listings(records: list, stamp_datetime: datetime = None):
+    """
+    Clean every source's records in one columnar pass: text whitespace, postal codes, prices to floats and
+    date strings to datetimes. With a stamp_datetime, upload, seen and checked dates are set to it
+    """
+    listing_batch = ListingBatch.from_records(records)
+    for col_name in TEXT_COLS:
+        listing_batch.map_strings(col_name, collapse_whitespace)
+    for col_name in POSTAL_CODE_COLS:
+        listing_batch.map_strings(col_name, clean_postal_codes)
+    for col_name, missing_value in PRICE_COLS.items():
+        if col_name in listing_batch.columns:
+            listing_batch.columns[col_name] = coerce_prices(
+                listing_batch.columns[col_name], missing_value
+            )
+    for col_name in DATE_COLS:
+        listing_batch.map_strings(col_name, parse_dates)
+    if stamp_datetime is not None:
+        for col_name in ("upload_date", "last_seen_date", "checked_date"):
+            listing_batch.fill(col_name, stamp_datetime)
+
+    return listing_batch.to_records()
@@ -1,6 +1,9 @@
 ROOM_DOMAIN = "https://www.room.nl"
 ROOM_RESULT_METADATA_DOMAIN = "https://roomapi.hexia.io/api/v1/actueel-aanbod?"
-ROOM_SEARCH_PARAMS = "limit=%s&locale=en_GB&page=0&sort=-publicationDate"
+ROOM_SEARCH_PARAMS = "limit=%s&locale=en_GB&page=%s&sort=-publicationDate"
+ROOM_PAGE_SIZE = 100
+# Extra attempts at a page still failing after the request level retries
+ROOM_PAGE_RETRIES = 2
 ROOM_L1_TARGET_RENTAL_KEYS = [
     "ID",
     "postalcode",
@@ -35,6 +38,8 @@ ROOM_Ln_TARGET_RENTAL_KEYS = [
     ["floor", "verdieping"],
     ["woningsoort", "localizedNaam"],
 ]
+# Alternative keys used when a Room rental omits the primary key
+ROOM_L1_KEY_FALLBACKS = {"postalcode": "postcode"}
 ROOM_DB_KEY_MAP_PATH = "db_mappings/room_mapping.json"
 
 KAMERNET_DOMAIN = "https://kamernet.nl"
@@ -65,7 +70,7 @@ KAMERNET_SEARCH_PL = {
     "ownerTypeIds": [],
     "variant": None,
     "searchview": 1,
-    "rowsPerPage": 18,
+    "rowsPerPage": 100,
     "OpResponse": {
         "Code": 1000,
         "Message": "Operation successful.",
@@ -90,11 +95,95 @@ KAMERNET_FURNISHING_MAP = {1: "uncarpeted", 2: "unfurnished", 3: "", 4: "furnish
 
 KAMERNET_LISTING_TYPE_MAP = {1: "room", 2: "apartment", 3: "", 4: "studio"}
 KAMERNET_DB_KEY_MAP_PATH = "db_mappings/kamernet_mapping.json"
+KAMERNET_MAX_IN_FLIGHT = 4
+# AIMD pacing of requests to the domain, see utils.PacingController
+KAMERNET_PACING = {
+    "initial_delay": 1.0,
+    "min_delay": 0.5,
+    "max_delay": 60.0,
+    "decrease_step": 0.1,
+}
 
 PARARIUS_DOMAIN = "https://www.pararius.com"
 PARARIUS_SEARCH_URL = "https://www.pararius.com/apartments/leiden/page-%.0f"
+PARARIUS_N_DRIVERS = 3
+# "http" for browserless fetches with Selenium fallback, or "selenium"
+PARARIUS_FETCH_MODE = "http"
+# Subtrees each Pararius parse step reads, used to restrict soup building
+PARARIUS_SEARCH_SUBTREE_CLASSES = [
+    "search-list-header__count",
+    "search-list__item--listing",
+]
+PARARIUS_DETAIL_SUBTREE_CLASSES = [
+    "listing-detail-summary__location",
+    "listing-features__list",
+]
+# AIMD pacing of requests to the domain, see utils.PacingController
+PARARIUS_PACING = {"initial_delay": 6.0, "min_delay": 2.0, "max_delay": 120.0}
 
 FUNDA_DOMAIN = "https://www.funda.nl"
 FUNDA_SEARCH_URL = "https://www.funda.nl/en/zoeken/huur?selected_area=%%5B%%22leiden%%22%%5D&search_result=%.0f"
+FUNDA_N_DRIVERS = 3
+FUNDA_FETCH_MODE = "http"
+# Subtrees each Funda parse step reads, used to restrict soup building
+FUNDA_SEARCH_SUBTREE_CLASSES = ["text-ellipsis"]
+FUNDA_SEARCH_SUBTREE_ATTRS = {"data-test-id": "search-result-item"}
+FUNDA_DETAIL_SUBTREE_CLASSES = [
+    "object-header__title",
+    "object-header__subtitle",
+    "fd-overflow-hidden",
+    "object-kenmerken-list-header",
+    "object-kenmerken-list",
+    "kenmerken-highlighted__value",
+]
+FUNDA_PACING = {"initial_delay": 4.0, "min_delay": 2.0, "max_delay": 120.0}
 
 PROXY_PATH = "proxy_list.txt"
+
+# Known Selenium listings are only re-fetched once their last full fetch is older than this
+INCREMENTAL_REFRESH_TTL_DAYS = 7
+DB_URL = "sqlite:///db/listings.db"
+# Raw responses of every run are archived here for offline replay
+RESPONSE_ARCHIVE_PATH = "db/response_archive"
+# Archived runs, and blobs only they reference, are deleted once this old
+RESPONSE_ARCHIVE_MAX_AGE_DAYS = 14
+# Per stage run metrics are written here for the node_exporter textfile collector
+METRICS_TEXTFILE_PATH = "db/metrics/puller_run.prom"
+# URLs each source requests, so per domain stage metrics are labelled by source name
+METRICS_SOURCE_URLS = {
+    "room": [ROOM_DOMAIN, ROOM_RESULT_METADATA_DOMAIN],
+    "kamernet": [KAMERNET_DOMAIN, KAMERNET_SEARCH_DOMAIN],
+    "pararius": [PARARIUS_DOMAIN],
+    "funda": [FUNDA_DOMAIN],
+}
+
+PULLER_SOURCES = ["room", "kamernet", "pararius", "funda"]
+# API pullers run in threads, Selenium pullers in their own processes
+PULLER_WORKER_MODES = {
+    "room": "thread",
+    "kamernet": "thread",
+    "pararius": "process",
+    "funda": "process",
+}
+PULLER_TIMEOUTS = {"room": 600, "kamernet": 900, "pararius": 7200, "funda": 7200}
+PULLER_MAX_CONCURRENT = 4
+# Streaming sources run in threads hand listings to the DB writer in chunks of this size as they are parsed
+PULLER_STREAM_CHUNK_SIZE = 1000
+
+# Daemon mode: minutes between runs of each source and of the mail digest, each spread by +/- the jitter fraction
+DAEMON_INTERVALS_MIN = {
+    "room": 10,
+    "kamernet": 10,
+    "pararius": 60,
+    "funda": 60,
+    "mail": 60,
+}
+DAEMON_INTERVAL_JITTER = 0.2
+# Warm browsers are restarted after this many page loads, or once their processes outgrow this much memory
+DAEMON_DRIVER_MAX_PAGES = 300
+DAEMON_DRIVER_MAX_RSS_MIB = 1500
+DAEMON_STATUS_PATH = "db/puller_daemon_status.json"
+# The status file is rewritten at least this often while idle, so a stale file means a hung daemon
+DAEMON_HEARTBEAT_SEC = 30
+# One textfile per task, so each source's latest metrics are kept alongside the others
+DAEMON_METRICS_TEXTFILE_PATH = "db/metrics/puller_daemon_%s.prom"
@@ -0,0 +1,307 @@
+# Long running alternative to CRON starting puller_run.py, keeping the interpreter, browsers, HTTP sessions,
+# proxy rankings and DB engine warm between runs. Each source, and the mail digest, runs on its own jittered interval.
+# Run: python3 puller_daemon.py --headless [--sources room kamernet] [--no-mail] [--status-file PATH]
+
+import argparse
+from archive import response_archive
+from datetime import datetime, timedelta
+from db import db_init
+import json
+import logging
+from metrics import run_metrics
+import os
+import puller_configs
+from puller_run import (
+    SOURCE_CLASSES,
+    ListingWriter,
+    export_run_metrics,
+    run_source,
+    send_digest,
+    store_results,
+)
+import random
+import signal
+import threading
+from time import perf_counter
+import utils
+
+
+logger = logging.getLogger(__name__)
+
+
+class PullerDaemon:
+    """
+    Runs one task at a time, each source or the mail digest, whenever its jittered interval comes due.
+    Health and last run state of every task are written to a status file
+    """
+
+    def __init__(
+        self,
+        sources: list = puller_configs.PULLER_SOURCES,
+        run_headless: bool = True,
+        mail: bool = True,
+        proxy_list_path: str = puller_configs.PROXY_PATH,
+        db_url: str = puller_configs.DB_URL,
+        status_path: str = puller_configs.DAEMON_STATUS_PATH,
+        intervals_min: dict = puller_configs.DAEMON_INTERVALS_MIN,
+        interval_jitter: float = puller_configs.DAEMON_INTERVAL_JITTER,
+        heartbeat_sec: float = puller_configs.DAEMON_HEARTBEAT_SEC,
+    ):
+        self.run_headless = run_headless
+        self.proxy_list_path = proxy_list_path
+        self.db_url = db_url
+        self.status_path = status_path
+        self.intervals_min = intervals_min
+        self.interval_jitter = interval_jitter
+        self.heartbeat_sec = heartbeat_sec
+        self.stop_event = threading.Event()
+        self.started_at = datetime.now()
+        self.current_task = None
+        self.archive_pruned_at = None
+
+        # Sources are due straight away, the first digest once they have had an interval to run
+        self.tasks = list(sources) + (["mail"] if mail else [])
+        self.task_state = {
+            x: {
+                "interval_min": intervals_min[x],
+                "next_run_at": (
+                    self.started_at + self.jittered_interval(x)
+                    if x == "mail"
+                    else self.started_at
+                ),
+                "last_started_at": None,
+                "last_finished_at": None,
+                "last_status": None,
+                "last_duration_sec": None,
+                "last_n_records": None,
+                "n_runs": 0,
+                "n_failures": 0,
+                "consecutive_failures": 0,
+            }
+            for x in self.tasks
+        }
+
+    def jittered_interval(self, task_name: str):
+        jitter_factor = 1 + random.uniform(-self.interval_jitter, self.interval_jitter)
+
+        return timedelta(minutes=self.intervals_min[task_name] * jitter_factor)
+
+    def stop(self, *_):
+        """
+        Stop once the running task, if any, finishes. Doubles as a signal handler
+        """
+        logger.info("Stopping puller daemon")
+        self.stop_event.set()
+
+    def write_status(self, state: str = None):
+        """
+        Replace the status file atomically so readers never see a partial write
+        """
+        if state is None:
+            state = "idle" if self.current_task is None else "running"
+        daemon_status = {
+            "pid": os.getpid(),
+            "state": state,
+            "current_task": self.current_task,
+            "started_at": self.started_at,
+            "updated_at": datetime.now(),
+            "warm_drivers": utils.count_warm_drivers(),
+            "tasks": self.task_state,
+        }
+        status_dir = os.path.dirname(self.status_path)
+        if status_dir != "":
+            os.makedirs(status_dir, exist_ok=True)
+        tmp_status_path = "%s.%s.tmp" % (self.status_path, os.getpid())
+        with open(tmp_status_path, "w") as status_file:
+            json.dump(daemon_status, status_file, indent=4, default=str)
+        os.replace(tmp_status_path, self.status_path)
+
+    def pull_source(self, source_name: str, run_id: str, listing_writer: ListingWriter):
+        """
+        Run a source in this process so its browsers stay warm, dropping them if the source fails.
+        Returns its results and status
+        """
+        try:
+            return run_source(
+                source_name,
+                run_headless=self.run_headless,
+                archive_run_id=run_id,
+                selenium_kwargs={
+                    "proxy_list_path": self.proxy_list_path,
+                    "db_url": self.db_url,
+                },
+                listing_writer=listing_writer,
+            )
+        except Exception:
+            source_domain = puller_configs.METRICS_SOURCE_URLS[source_name][0]
+            n_quit = utils.quit_warm_drivers(source_domain)
+            if n_quit > 0:
+                logger.info("Quit %s warm drivers of %s" % (n_quit, source_name))
+            raise
+
+    def prune_archive_if_due(self):
+        """
+        Prune the response archive at most once a day, pruning failures are logged without stopping the daemon
+        """
+        if (
+            self.archive_pruned_at is not None
+            and datetime.now() - self.archive_pruned_at < timedelta(days=1)
+        ):
+            return
+        self.archive_pruned_at = datetime.now()
+        try:
+            response_archive.prune_archive(
+                puller_configs.RESPONSE_ARCHIVE_PATH,
+                puller_configs.RESPONSE_ARCHIVE_MAX_AGE_DAYS,
+            )
+        except OSError:
+            logger.exception("Failed to prune response archive")
+
+    def run_task(self, task_name: str):
+        """
+        Run a task, store its results and metrics, then schedule its next run
+        """
+        task_state = self.task_state[task_name]
+        task_started_at = datetime.now()
+        self.current_task = task_name
+        task_state["last_started_at"] = task_started_at
+        self.write_status()
+
+        run_metrics.reset_stage_metrics()
+        run_id = "%s-%s" % (task_started_at.strftime("%Y%m%d-%H%M%S"), task_name)
+        task_start_time = perf_counter()
+        listing_writer = ListingWriter(self.db_url)
+        results = []
+        upsert_counts = {}
+        try:
+            task_status = "ok"
+            with run_metrics.stage_timer(task_name, "total"):
+                if task_name == "mail":
+                    send_digest(db_url=self.db_url)
+                else:
+                    results, task_status = self.pull_source(
+                        task_name, run_id, listing_writer
+                    )
+            if task_status != "ok":
+                # Count lost pages against the source's total stage, as puller_run does for partial sources
+                run_metrics.record_stage(
+                    task_name, "total", 0.0, is_error=True, count=0
+                )
+            # Streaming sources have already written their listings, which still need resolving
+            if len(results) > 0 or listing_writer.n_records > 0:
+                upsert_counts = store_results(
+                    results, db_url=self.db_url, listing_writer=listing_writer
+                )
+        except Exception:
+            logger.exception("Daemon task %s failed" % task_name)
+            task_status = "error"
+
+        task_finished_at = datetime.now()
+        task_state.update(
+            {
+                "last_finished_at": task_finished_at,
+                "last_status": task_status,
+                "last_duration_sec": perf_counter() - task_start_time,
+                "last_n_records": listing_writer.n_records,
+                "n_runs": task_state["n_runs"] + 1,
+                "next_run_at": task_finished_at + self.jittered_interval(task_name),
+            }
+        )
+        if task_status == "ok":
+            task_state["consecutive_failures"] = 0
+        else:
+            task_state["n_failures"] += 1
+            task_state["consecutive_failures"] += 1
+        self.current_task = None
+
+        export_run_metrics(
+            {
+                "run_id": run_id,
+                "archive_run_id": run_id,
+                "mode": "daemon",
+                "run_labels": {"task": task_name},
+                "started_at": task_started_at.isoformat(),
+                "finished_at": task_finished_at.isoformat(),
+                "finished_timestamp": task_finished_at.timestamp(),
+                "duration_sec": task_state["last_duration_sec"],
+                "n_records": listing_writer.n_records,
+                "upsert_counts": upsert_counts,
+            },
+            db_url=self.db_url,
+            textfile_path=puller_configs.DAEMON_METRICS_TEXTFILE_PATH % task_name,
+        )
+        self.write_status()
+
+    def run(self):
+        """
+        Run due tasks until stopped, rewriting the status file at least every heartbeat while idle
+        """
+        logger.info("Puller daemon started for %s" % ", ".join(self.tasks))
+        while not self.stop_event.is_set():
+            next_task = min(self.tasks, key=lambda x: self.task_state[x]["next_run_at"])
+            wait_sec = (
+                self.task_state[next_task]["next_run_at"] - datetime.now()
+            ).total_seconds()
+            if wait_sec > 0:
+                self.prune_archive_if_due()
+                self.write_status()
+                self.stop_event.wait(min(wait_sec, self.heartbeat_sec))
+                continue
+            self.run_task(next_task)
+
+        n_quit = utils.quit_warm_drivers()
+        logger.info("Puller daemon stopped, quit %s warm drivers" % n_quit)
+        self.write_status(state="stopped")
+
+
+def parse_cli_args(cli_args: list = None):
+    arg_parser = argparse.ArgumentParser(
+        description="Pull each source on its own interval, keeping browsers and connections warm"
+    )
+    arg_parser.add_argument(
+        "--sources",
+        nargs="+",
+        choices=list(SOURCE_CLASSES),
+        default=puller_configs.PULLER_SOURCES,
+        help="Sources to pull, all by default",
+    )
+    arg_parser.add_argument(
+        "--headless", action="store_true", help="Run Selenium browsers headless"
+    )
+    arg_parser.add_argument(
+        "--no-mail", action="store_true", help="Never mail new listings"
+    )
+    arg_parser.add_argument(
+        "--proxy-file",
+        default=puller_configs.PROXY_PATH,
+        help="Newline separated proxies for Selenium sources",
+    )
+    arg_parser.add_argument("--db-url", default=puller_configs.DB_URL)
+    arg_parser.add_argument(
+        "--status-file",
+        default=puller_configs.DAEMON_STATUS_PATH,
+        help="JSON file health and last run state are written to",
+    )
+
+    return arg_parser.parse_args(cli_args)
+
+
+if __name__ == "__main__":
+    cli_args = parse_cli_args()
+    db_init.validate_database(cli_args.db_url)
+    utils.configure_driver_lifecycle(
+        keep_warm=True,
+        max_pages=puller_configs.DAEMON_DRIVER_MAX_PAGES,
+        max_rss_mib=puller_configs.DAEMON_DRIVER_MAX_RSS_MIB,
+    )
+    puller_daemon = PullerDaemon(
+        sources=cli_args.sources,
+        run_headless=cli_args.headless,
+        mail=not cli_args.no_mail,
+        proxy_list_path=cli_args.proxy_file,
+        db_url=cli_args.db_url,
+        status_path=cli_args.status_file,
+    )
+    signal.signal(signal.SIGTERM, puller_daemon.stop)
+    signal.signal(signal.SIGINT, puller_daemon.stop)
+    puller_daemon.run()
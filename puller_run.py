@@ -1,13 +1,23 @@
+from archive import response_archive
+import argparse
 from datetime import datetime
 from db import db_init
-from itertools import chain
+from itertools import chain, islice
 import logging
 from logging import StreamHandler
+from metrics import run_metrics
+from multiprocessing import Process, Queue, parent_process
+import puller_configs
 from pullers import Funda, Kamernet, Pararius, Room
-import sys
-import warnings
-from utils import push_to_db
-from mail_generate import MailGenerator
+import queue
+from threading import Lock, Thread
+from time import perf_counter
+from utils import (
+    get_engine,
+    get_pacing_stats,
+    get_request_stats,
+    push_listings_to_db,
+)
 
 
 logging.basicConfig(
@@ -18,47 +28,517 @@ logging.getLogger(__name__).setLevel(logging.INFO)
 logging.getLogger(__name__).addHandler(StreamHandler())
 
 
-def execute_pullers(run_headless: bool = True):
+logger = logging.getLogger(__name__)
+
+SOURCE_CLASSES = {
+    "room": Room,
+    "kamernet": Kamernet,
+    "pararius": Pararius,
+    "funda": Funda,
+}
+
+run_metrics.register_sources(puller_configs.METRICS_SOURCE_URLS)
+
+
+class ListingWriter:
     """
-    Initialize and execute pullers to retrieve data
+    Normalises and upserts listings, all stamped with the time the writer was created, tallying records and
+    upsert counts across writes. Streaming sources write to it in chunks while they run
     """
-    room_obj = Room()
-    kamer_obj = Kamernet()
-    pararius_obj = Pararius(headless=run_headless)
-    funda_obj = Funda(headless=run_headless)
 
-    obj_list = [room_obj, kamer_obj, pararius_obj, funda_obj]
-    pulled_results = [x.parse_rentals() for x in obj_list]
+    def __init__(
+        self, db_url: str = puller_configs.DB_URL, stamp_datetime: datetime = None
+    ):
+        if stamp_datetime is None:
+            stamp_datetime = datetime.now().replace(second=0, microsecond=0)
+        self.db_url = db_url
+        self.stamp_datetime = stamp_datetime
+        self.n_records = 0
+        self.upsert_counts = {}
+        self.lock = Lock()
+
+    def write(self, records: list):
+        if len(records) == 0:
+            return
+        # Imported here so runs only load NumPy once there are listings to normalise
+        from normalise.listing_batch import normalise_listings
+
+        with self.lock:
+            with run_metrics.stage_timer("all", "normalise"):
+                records = normalise_listings(
+                    records, stamp_datetime=self.stamp_datetime
+                )
+            upsert_start = perf_counter()
+            chunk_upsert_counts = push_listings_to_db(
+                records, db_url=self.db_url, observed_at=self.stamp_datetime
+            )
+            run_metrics.record_stage(
+                "all", "upsert", perf_counter() - upsert_start, n_records=len(records)
+            )
+            self.n_records += len(records)
+            for upsert_result, n_upserted in chunk_upsert_counts.items():
+                self.upsert_counts[upsert_result] = (
+                    self.upsert_counts.get(upsert_result, 0) + n_upserted
+                )
+
+
+def run_source(
+    source_name: str,
+    run_headless: bool = True,
+    archive_run_id: str = None,
+    replay: bool = False,
+    selenium_kwargs: dict = None,
+    listing_writer: ListingWriter = None,
+):
+    """
+    Initialize and parse a single source, archiving raw responses under archive_run_id or replaying them from it.
+    selenium_kwargs are extra init arguments for sources run in processes, e.g. proxy_list_path or db_url.
+    Given a listing_writer, sources that can stream their listings write them in chunks and return none.
+    Returns the results and the source's status, partial if any pages were lost
+    """
+    if archive_run_id is not None:
+        response_archive.activate_archive(
+            puller_configs.RESPONSE_ARCHIVE_PATH, archive_run_id, replay=replay
+        )
+
+    source_class = SOURCE_CLASSES[source_name]
+    if puller_configs.PULLER_WORKER_MODES[source_name] == "process":
+        source_kwargs = {"headless": run_headless}
+        if selenium_kwargs is not None:
+            source_kwargs.update(selenium_kwargs)
+        if replay:
+            source_kwargs.update({"fetch_mode": "replay", "incremental": False})
+        source_obj = source_class(**source_kwargs)
+    else:
+        source_obj = source_class()
+
+    if listing_writer is not None and hasattr(source_obj, "iter_parsed_rentals"):
+        parsed_rentals = source_obj.iter_parsed_rentals()
+        source_results = []
+        while True:
+            records_chunk = list(
+                islice(parsed_rentals, puller_configs.PULLER_STREAM_CHUNK_SIZE)
+            )
+            if len(records_chunk) == 0:
+                break
+            listing_writer.write(records_chunk)
+    else:
+        source_results = source_obj.parse_rentals()
+
+    failed_pages = getattr(source_obj, "failed_pages", [])
+    if len(failed_pages) > 0:
+        logger.warning(
+            "Source %s lost %s pages: %s"
+            % (source_name, len(failed_pages), failed_pages)
+        )
+        return source_results, "partial"
+
+    return source_results, "ok"
+
+
+def source_worker(
+    source_name: str,
+    run_headless: bool,
+    result_queue,
+    archive_run_id: str = None,
+    replay: bool = False,
+    selenium_kwargs: dict = None,
+    listing_writer: ListingWriter = None,
+):
+    """
+    Worker target running one source and reporting results, timing and stage metrics back through a queue.
+    Stage metrics only need sending from worker processes, threads record straight into the shared tally
+    """
+    in_worker_process = parent_process() is not None
+    if in_worker_process:
+        # Forked workers inherit the parent's tally, which must not be merged back twice
+        run_metrics.reset_stage_metrics()
+    start_time = perf_counter()
+    try:
+        source_results, status = run_source(
+            source_name,
+            run_headless=run_headless,
+            archive_run_id=archive_run_id,
+            replay=replay,
+            selenium_kwargs=selenium_kwargs,
+            listing_writer=listing_writer,
+        )
+    except Exception:
+        logger.exception("Source %s failed" % source_name)
+        source_results = []
+        status = "error"
+    wall_time = perf_counter() - start_time
+    worker_stage_metrics = None
+    if in_worker_process:
+        worker_stage_metrics = run_metrics.get_stage_metrics()
+    result_queue.put(
+        (source_name, status, source_results, wall_time, worker_stage_metrics)
+    )
+
+
+def log_source_timings(source_timings: dict, total_wall_time: float):
+    """
+    Log per source wall time against the serial equivalent, recording each as the source's total stage
+    """
+    for source_name, (status, wall_time) in source_timings.items():
+        logger.info("Source %s: %s in %.1fs" % (source_name, status, wall_time))
+        run_metrics.record_stage(
+            source_name, "total", wall_time, is_error=status != "ok"
+        )
+    serial_wall_time = sum(x[1] for x in source_timings.values())
+    logger.info(
+        "Pullers complete in %.1fs (serial equivalent %.1fs)"
+        % (total_wall_time, serial_wall_time)
+    )
+
+
+def execute_pullers_serial(
+    run_headless: bool = True,
+    sources: list = None,
+    archive_run_id: str = None,
+    replay: bool = False,
+    selenium_kwargs: dict = None,
+    listing_writer: ListingWriter = None,
+):
+    """
+    Initialize and execute pullers one after another, streaming sources writing to listing_writer if given
+    """
+    if sources is None:
+        sources = puller_configs.PULLER_SOURCES
+
+    run_start_time = perf_counter()
+    source_timings = {}
+    pulled_results = []
+    for source_name in sources:
+        result_queue = queue.Queue()
+        source_worker(
+            source_name,
+            run_headless,
+            result_queue,
+            archive_run_id=archive_run_id,
+            replay=replay,
+            selenium_kwargs=selenium_kwargs,
+            listing_writer=listing_writer,
+        )
+        _, status, source_results, wall_time, _ = result_queue.get()
+        source_timings[source_name] = (status, wall_time)
+        pulled_results.append(source_results)
+
+    log_source_timings(source_timings, perf_counter() - run_start_time)
     flattened_results = list(chain(*pulled_results))
     return flattened_results
 
 
-if __name__ == "__main__":
+def execute_pullers(
+    run_headless: bool = True,
+    sources: list = None,
+    max_concurrent: int = puller_configs.PULLER_MAX_CONCURRENT,
+    source_timeouts: dict = None,
+    poll_interval: float = 1.0,
+    archive_run_id: str = None,
+    replay: bool = False,
+    selenium_kwargs: dict = None,
+    listing_writer: ListingWriter = None,
+):
     """
-    Executes all pullers as well as push to DB. Can run headless with argument T or F.
+    Initialize and execute pullers concurrently, API pullers in threads and Selenium pullers in processes.
+    A failed, crashed or timed out source is logged and contributes no results without affecting the others.
+    Streaming sources run in threads write to listing_writer, if given, as they go
     """
-    if len(sys.argv) == 1:
-        is_headless_str = "F"
+    if sources is None:
+        sources = puller_configs.PULLER_SOURCES
+    if source_timeouts is None:
+        source_timeouts = puller_configs.PULLER_TIMEOUTS
+
+    result_queue = Queue()
+    pending_sources = list(sources)
+    running_workers = {}
+    source_timings = {}
+    pulled_results = {}
+
+    run_start_time = perf_counter()
+    while len(pending_sources) > 0 or len(running_workers) > 0:
+        while len(pending_sources) > 0 and len(running_workers) < max_concurrent:
+            source_name = pending_sources.pop(0)
+            worker_args = (
+                source_name,
+                run_headless,
+                result_queue,
+                archive_run_id,
+                replay,
+                selenium_kwargs,
+            )
+            if puller_configs.PULLER_WORKER_MODES[source_name] == "process":
+                worker = Process(
+                    target=source_worker,
+                    name="Puller_%s" % source_name,
+                    args=worker_args,
+                )
+            else:
+                worker = Thread(
+                    target=source_worker,
+                    name="Puller_%s" % source_name,
+                    args=worker_args + (listing_writer,),
+                    daemon=True,
+                )
+            worker.start()
+            running_workers[source_name] = (worker, perf_counter())
+            logger.info("Started source %s" % source_name)
+
+        # Drain results before joining so processes are not blocked on a full pipe
+        try:
+            (
+                source_name,
+                status,
+                source_results,
+                wall_time,
+                worker_stage_metrics,
+            ) = result_queue.get(timeout=poll_interval)
+            # Late results from sources already marked as timed out are dropped
+            if source_name in running_workers:
+                worker, _ = running_workers.pop(source_name)
+                worker.join()
+                source_timings[source_name] = (status, wall_time)
+                pulled_results[source_name] = source_results
+                if worker_stage_metrics is not None:
+                    run_metrics.merge_stage_metrics(worker_stage_metrics)
+        except queue.Empty:
+            pass
+
+        for source_name, (worker, start_time) in list(running_workers.items()):
+            elapsed_time = perf_counter() - start_time
+            # A process killed before reporting, e.g. by a segfault or the OOM killer, frees its slot straight away.
+            # One exiting cleanly has flushed its result to the queue, so is left for the next drain
+            if (
+                isinstance(worker, Process)
+                and not worker.is_alive()
+                and worker.exitcode != 0
+            ):
+                worker.join()
+                logger.warning(
+                    "Source %s crashed with exit code %s after %.1fs"
+                    % (source_name, worker.exitcode, elapsed_time)
+                )
+                running_workers.pop(source_name)
+                source_timings[source_name] = ("crashed", elapsed_time)
+                continue
+            if elapsed_time < source_timeouts.get(source_name, float("inf")):
+                continue
+            # Hung threads cannot be killed, they are daemonized and abandoned
+            if isinstance(worker, Process):
+                worker.terminate()
+                worker.join()
+            logger.warning(
+                "Source %s timed out after %.1fs" % (source_name, elapsed_time)
+            )
+            running_workers.pop(source_name)
+            source_timings[source_name] = ("timeout", elapsed_time)
+
+    log_source_timings(source_timings, perf_counter() - run_start_time)
+    flattened_results = list(
+        chain(*[pulled_results[x] for x in sources if x in pulled_results])
+    )
+    return flattened_results
+
+
+def store_results(
+    results: list,
+    db_url: str = puller_configs.DB_URL,
+    listing_writer: ListingWriter = None,
+):
+    """
+    Normalise pulled listings in one columnar pass stamped with the current minute, upsert them and resolve
+    cross source duplicates. Every step covers all sources at once, so is recorded under "all".
+    Given the listing_writer streaming sources wrote to, its stamp is used and its counts included. Returns the upsert counts
+    """
+    if listing_writer is None:
+        listing_writer = ListingWriter(db_url)
+    listing_writer.write(results)
+    with run_metrics.stage_timer("all", "dedup"):
+        from dedup.property_matching import resolve_property_ids
+
+        resolve_property_ids(get_engine(db_url))
+
+    return listing_writer.upsert_counts
+
+
+def send_digest(db_url: str = puller_configs.DB_URL):
+    """
+    Mail listings new since the last digest, if there are any
+    """
+    if not db_url.startswith("sqlite:///"):
+        logger.warning("Mail digest needs an SQLite database, skipping mail")
+        return
+    with run_metrics.stage_timer("all", "mail"):
+        # Imported here so runs without mail never load the templating and mail stack
+        from mail_generate import MailGenerator
+
+        mail_gen = MailGenerator(db_url=db_url.replace("sqlite:///", "", 1))
+        if mail_gen.new_listings is not None:
+            mail_gen.execute_mail()
+
+
+def export_run_metrics(
+    run_summary: dict,
+    db_url: str = puller_configs.DB_URL,
+    textfile_path: str = puller_configs.METRICS_TEXTFILE_PATH,
+):
+    """
+    Write the run's stage metrics to the Prometheus textfile and the runs tables.
+    Export failures are logged without failing the run
+    """
+    stage_metrics = run_metrics.get_stage_metrics()
+    source_totals = [v for k, v in stage_metrics.items() if k[1] == "total"]
+    n_failed_sources = sum(x["errors"] for x in source_totals)
+    if n_failed_sources == 0:
+        run_summary["status"] = "ok"
+    elif n_failed_sources < len(source_totals):
+        run_summary["status"] = "partial"
     else:
-        is_headless_str = sys.argv[1]
+        run_summary["status"] = "error"
+    run_summary["success"] = int(n_failed_sources == 0)
+
+    for (source, stage), stage_stats in sorted(stage_metrics.items()):
+        logger.info(
+            "Stage %s/%s: %s ops, %s errors, %.1fs total, %.1fs max"
+            % (
+                source,
+                stage,
+                stage_stats["count"],
+                stage_stats["errors"],
+                stage_stats["total_sec"],
+                stage_stats["max_sec"],
+            )
+        )
+    try:
+        run_metrics.write_prometheus_textfile(textfile_path, run_summary, stage_metrics)
+    except OSError:
+        logger.exception("Failed to write metrics textfile")
+    try:
+        run_metrics.store_run(get_engine(db_url), run_summary, stage_metrics)
+    except Exception:
+        logger.exception("Failed to store run metrics")
+
+
+def parse_cli_args(cli_args: list = None):
+    """
+    Parse puller_run command line arguments. A bare T/F headless flag is still accepted for existing CRON entries
+    """
+    arg_parser = argparse.ArgumentParser(
+        description="Pull listings from every source, upsert them and mail new ones"
+    )
+    arg_parser.add_argument(
+        "legacy_headless",
+        nargs="?",
+        choices=["T", "F"],
+        help="Deprecated, use --headless",
+    )
+    arg_parser.add_argument(
+        "--sources",
+        nargs="+",
+        choices=list(SOURCE_CLASSES),
+        default=puller_configs.PULLER_SOURCES,
+        help="Sources to pull, all by default",
+    )
+    arg_parser.add_argument(
+        "--headless", action="store_true", help="Run Selenium browsers headless"
+    )
+    arg_parser.add_argument(
+        "--no-mail", action="store_true", help="Skip mailing new listings"
+    )
+    arg_parser.add_argument(
+        "--proxy-file",
+        default=puller_configs.PROXY_PATH,
+        help="Newline separated proxies for Selenium sources",
+    )
+    arg_parser.add_argument("--db-url", default=puller_configs.DB_URL)
+    arg_parser.add_argument(
+        "--replay",
+        metavar="RUN_ID",
+        help="Re-parse and upsert an archived run without network access or mail",
+    )
+    parsed_args = arg_parser.parse_args(cli_args)
+    if parsed_args.legacy_headless == "T":
+        parsed_args.headless = True
+
+    return parsed_args
 
-    if is_headless_str == "T":
-        is_headless = True
-    elif is_headless_str == "F":
-        is_headless = False
+
+if __name__ == "__main__":
+    """
+    Executes the selected pullers, pushes results to DB and mails new listings.
+    With --replay <run-id>, re-parses and upserts that run's archived responses without network access or mail.
+    """
+    cli_args = parse_cli_args()
+    replay_run_id = cli_args.replay
+    is_headless = cli_args.headless
+    db_url = cli_args.db_url
+    run_start_time = perf_counter()
+    run_started_at = datetime.now()
+    run_id = run_started_at.strftime("%Y%m%d-%H%M%S")
+    is_replay = replay_run_id is not None
+    if is_replay:
+        archive_run_id = replay_run_id
+        logger.info("Replaying archived run %s" % archive_run_id)
     else:
-        warnings.warn(
-            "Unaccepted parameter for headless passed. Defaulting to non-headless."
+        archive_run_id = run_id
+        logger.info("Archiving responses under run id %s" % archive_run_id)
+
+    db_init.validate_database(db_url)
+    stamp_datetime = None
+    if is_replay:
+        # Stamped with the run's fetch time, so replayed listings are not treated as freshly checked
+        replay_archive = response_archive.activate_archive(
+            puller_configs.RESPONSE_ARCHIVE_PATH, archive_run_id, replay=True
         )
-        is_headless = False
-
-    db_init.validate_database()
-    results = execute_pullers(run_headless=is_headless)
-    curr_datetime = datetime.now()
-    truncated_datetime = curr_datetime.replace(second=0, microsecond=0)
-    [x.update({"upload_date": truncated_datetime}) for x in results]
-    push_to_db(results)
-
-    mail_gen = MailGenerator()
-    if mail_gen.new_listings is not None:
-        mail_gen.execute_mail()
+        replay_fetched_at = replay_archive.latest_fetched_at()
+        if replay_fetched_at is not None:
+            stamp_datetime = replay_fetched_at.replace(second=0, microsecond=0)
+    listing_writer = ListingWriter(db_url, stamp_datetime=stamp_datetime)
+    results = execute_pullers(
+        run_headless=is_headless,
+        sources=cli_args.sources,
+        archive_run_id=archive_run_id,
+        replay=is_replay,
+        selenium_kwargs={"proxy_list_path": cli_args.proxy_file, "db_url": db_url},
+        listing_writer=listing_writer,
+    )
+    for domain, domain_stats in get_request_stats().items():
+        logger.info(
+            "HTTP %s: %s requests, %s errors, %s retries, mean latency %.2fs"
+            % (
+                domain,
+                domain_stats["requests"],
+                domain_stats["errors"],
+                domain_stats["retries"],
+                domain_stats["mean_latency"],
+            )
+        )
+    for domain, pacing_summary in get_pacing_stats().items():
+        logger.info("Pacing %s: %s" % (domain, pacing_summary))
+    upsert_counts = store_results(results, db_url=db_url, listing_writer=listing_writer)
+
+    # Replays re-run parsing and upserts only, never mail or prune
+    if not is_replay and not cli_args.no_mail:
+        send_digest(db_url=db_url)
+    if not is_replay:
+        response_archive.prune_archive(
+            puller_configs.RESPONSE_ARCHIVE_PATH,
+            puller_configs.RESPONSE_ARCHIVE_MAX_AGE_DAYS,
+        )
+
+    run_finished_at = datetime.now()
+    export_run_metrics(
+        {
+            "run_id": run_id,
+            "archive_run_id": archive_run_id,
+            "mode": "replay" if is_replay else "live",
+            "started_at": run_started_at.isoformat(),
+            "finished_at": run_finished_at.isoformat(),
+            "finished_timestamp": run_finished_at.timestamp(),
+            "duration_sec": perf_counter() - run_start_time,
+            "n_records": listing_writer.n_records,
+            "upsert_counts": upsert_counts,
+        },
+        db_url=db_url,
+    )
@@ -1,39 +1,68 @@
 # Instantiatable classes for specific rental sites. Classes hold raw data but return formatted data
 
+from archive import response_archive
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime, timedelta
 import json
 import logging
 from math import ceil
+from metrics import run_metrics
 import puller_configs
-import random
 import re
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from time import sleep
+from time import monotonic, perf_counter
 import utils
 
 
 logger = logging.getLogger(__name__)
 
 
+# Street name, house number and any addition of a schema.org streetAddress, e.g. Van Eeghenstraat 12 A
+FUNDA_STREET_ADDRESS_PATTERN = re.compile(r"^(.+?)\s+(\d+)\s*[-\s]?\s*(\S*)$")
+# schema.org offer availability to whether the DOM status reads Available/Beschikbaar, e.g. LimitedAvailability
+# is under option. Pages with other values are parsed from the DOM, so both paths date a listing alike
+FUNDA_JSON_LD_AVAILABLE = {
+    "InStock": True,
+    "LimitedAvailability": False,
+    "OutOfStock": False,
+    "SoldOut": False,
+}
+
+
+def start_of_today():
+    """
+    Midnight today, for dates relative to now, so listings refetched within a day keep the same content hash
+    """
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
 class Room:
     """
     Queries Room for rental information straight from Hexia
     """
 
-    def __init__(self, domain: str = puller_configs.ROOM_DOMAIN):
+    def __init__(
+        self,
+        domain: str = puller_configs.ROOM_DOMAIN,
+        page_size: int = puller_configs.ROOM_PAGE_SIZE,
+        page_retries: int = puller_configs.ROOM_PAGE_RETRIES,
+        fetch_results: bool = True,
+    ):
         """
-        On initialization immediately queries for results and loads relevant mapping configs
+        On initialization queries for the result count and loads relevant mapping configs. Rentals are paged in lazily.
+        With fetch_results False no request is made, for parsing rentals supplied directly
         """
         self.site_domain = domain
-        search_domain = puller_configs.ROOM_RESULT_METADATA_DOMAIN
-        total_results_count = self.get_total_results_count(
-            total_result_domain=search_domain
-        )
-        fmted_search_params = puller_configs.ROOM_SEARCH_PARAMS % total_results_count
-        search_url = search_domain + fmted_search_params
-        self.rentals = self.get_total_results(result_search_url=search_url)
+        self.search_domain = puller_configs.ROOM_RESULT_METADATA_DOMAIN
+        self.page_size = page_size
+        self.page_retries = page_retries
+        # Pages still failing after retries, whose rentals are missing from the results
+        self.failed_pages = []
+        self.total_results_count = 0
+        if fetch_results:
+            self.total_results_count = self.get_total_results_count(
+                total_result_domain=self.search_domain
+            )
         mapping_f = open(puller_configs.ROOM_DB_KEY_MAP_PATH)
         self.db_mapping_dict = json.load(mapping_f)
         logger.info("Room init. complete")
@@ -51,113 +80,146 @@ class Room:
 
         return n_total_results
 
-    def get_total_results(self, result_search_url: str):
+    def get_page_results(self, result_search_url: str):
         """
-        Wrapper for pulling all rentals from Room Hexia API
+        Wrapper for pulling a single page of rentals from Room Hexia API
         """
-        total_results_resp_dict = utils.generic_get_request_wrap(
+        page_results_resp_dict = utils.generic_get_request_wrap(
             result_search_url, json.loads
         )
-        result_rentals = total_results_resp_dict["data"]
+        result_rentals = page_results_resp_dict["data"]
 
         return result_rentals
 
-    def parse_rental_obj(
-        self, rental_obj: dict, layer1_target_keys: list, layern_target_keys: list
-    ):
+    def iter_rentals(self):
         """
-        Recursively extract nested values from rental JSON return as define by target key params
+        Page through Room Hexia API with fixed size pages, yielding raw rentals one page at a time.
+        A failed page is retried, then skipped and added to failed_pages so earlier and later pages are kept
         """
-        parsed_results = {}
-        # Layer 1 handling for standard dict key value return
-        if layer1_target_keys is not None:
-            l1_results = {x: rental_obj[x] for x in layer1_target_keys}
-            parsed_results.update(l1_results)
-            if layern_target_keys is None:
-                return l1_results
-        l2_results = {}
-        # Check for multi layer keys
-        for ln_key in layern_target_keys:
-            layernm1_key = ln_key.pop(0)
-            layernm1_obj = rental_obj[layernm1_key]
-            # Final layer if length of key list is 1 - return value through l2_results
-            if len(ln_key) == 1:
-                ln_key_str = ln_key[0]
-                ln_result = self.parse_rental_obj(
-                    layernm1_obj, layer1_target_keys=ln_key, layern_target_keys=None
-                )
-                ln_result_key = "%s_%s" % (layernm1_key, ln_key_str)
-                l2_results[ln_result_key] = ln_result[ln_key_str]
-            # If key list is > 1, continue to dig with layer1_target_keys being None
-            elif len(ln_key) > 1:
-                # ln_key_new_lead = ln_key[0]
-                ln_key_list_sub_keys = ln_key[1:]
-                if len(ln_key_list_sub_keys) == 1:
-                    l2_results = self.parse_rental_obj(
-                        layernm1_obj,
-                        layer1_target_keys=ln_key_list_sub_keys,
-                        layern_target_keys=None,
-                    )
-                else:
-                    l2_results = self.parse_rental_obj(
-                        layernm1_obj,
-                        layer1_target_keys=None,
-                        layern_target_keys=[ln_key_list_sub_keys],
+        n_pages_required = ceil(self.total_results_count / self.page_size)
+        for page_i in range(n_pages_required):
+            fmted_search_params = puller_configs.ROOM_SEARCH_PARAMS % (
+                self.page_size,
+                page_i,
+            )
+            search_url = self.search_domain + fmted_search_params
+            page_rentals = None
+            for attempt in range(self.page_retries + 1):
+                try:
+                    page_rentals = self.get_page_results(result_search_url=search_url)
+                    break
+                except (ValueError, OSError) as page_error:
+                    logger.warning(
+                        "Failed to pull Room page %s (attempt %s of %s): %s"
+                        % (page_i, attempt + 1, self.page_retries + 1, page_error)
                     )
-            elif len(ln_key) == 0:
-                l2_results = {layernm1_key: layernm1_obj}
-                return l2_results
+            if page_rentals is None:
+                self.failed_pages.append(page_i)
+                continue
+            yield from page_rentals
 
-        parsed_results.update(l2_results)
+    def compile_rental_extractor(self, L1_keymap: list, Ln_keymap: list):
+        """
+        Compile keymaps and DB mapping once into a flat tuple of (DB column, lead key, sub key path, fallback key)
+        """
+        rental_extractor = []
+        for l1_key in L1_keymap:
+            db_col = self.db_mapping_dict[l1_key]
+            fallback_key = puller_configs.ROOM_L1_KEY_FALLBACKS.get(l1_key)
+            rental_extractor.append((db_col, l1_key, (), fallback_key))
+        for ln_key in Ln_keymap:
+            db_col = self.db_mapping_dict["_".join(ln_key)]
+            rental_extractor.append((db_col, ln_key[0], tuple(ln_key[1:]), None))
+
+        return tuple(rental_extractor)
+
+    def parse_rental_obj(self, rental_obj: dict, rental_extractor: tuple):
+        """
+        Extract nested values from rental JSON straight into DB columns in a single pass
+        """
+        parsed_results = {}
+        for db_col, lead_key, sub_keys, fallback_key in rental_extractor:
+            if lead_key in rental_obj:
+                value = rental_obj[lead_key]
+            elif fallback_key is None:
+                raise KeyError(lead_key)
+            elif fallback_key in rental_obj:
+                value = rental_obj[fallback_key]
+            else:
+                continue
+            for sub_key in sub_keys:
+                if value is None:
+                    break
+                value = value[sub_key]
+            parsed_results[db_col] = value
 
         return parsed_results
 
-    def parse_rentals(
+    def iter_parsed_rentals(
         self,
+        rentals=None,
         L1_keymap: list = puller_configs.ROOM_L1_TARGET_RENTAL_KEYS,
         Ln_keymap: list = puller_configs.ROOM_Ln_TARGET_RENTAL_KEYS,
     ):
         """
-        Shorten extracted rentals into DB friendly format and prepare for upload to DB
+        Shorten extracted rentals into DB friendly format, yielding each as it is parsed.
+        Pages through the API when no rentals are passed
         """
-
-        logger.info("Starting Room parse")
-
-        shortened_results = []
-        for rental_obj in self.rentals:
-            tmp_l1_keys = deepcopy(L1_keymap)
-            tmp_ln_keys = deepcopy(Ln_keymap)
-
-            if "postalcode" not in rental_obj and "postalcode" in tmp_l1_keys:
-                tmp_l1_keys.pop(tmp_l1_keys.index("postalcode"))
-                if "postcode" in rental_obj:
-                    tmp_l1_keys.append("postcode")
-
+        if rentals is None:
+            rentals = self.iter_rentals()
+
+        rental_extractor = self.compile_rental_extractor(L1_keymap, Ln_keymap)
+        amenities_col = self.db_mapping_dict["specifiekeVoorzieningen"]
+        domain_col = self.db_mapping_dict["domain"]
+
+        # Rentals may be paged in lazily, so only time spent parsing is summed for the parse stage
+        parse_time = 0.0
+        n_parsed = 0
+        for rental_obj in rentals:
+            parse_start = perf_counter()
             if "street" not in rental_obj:
                 continue
 
             if "houseNumber" not in rental_obj:
                 continue
 
-            if "gemeenteGeoLocatieNaam" not in rental_obj:
+            if rental_obj.get("gemeenteGeoLocatieNaam") is None:
                 continue
 
-            if rental_obj["gemeenteGeoLocatieNaam"] is None:
-                continue
+            parsed_info_dict = self.parse_rental_obj(rental_obj, rental_extractor)
+            amenity_details = parsed_info_dict.get(amenities_col)
+            if amenity_details is not None:
+                amenity_list = [x["localizedName"] for x in amenity_details]
+                parsed_info_dict[amenities_col] = ", ".join(amenity_list)
+            parsed_info_dict[domain_col] = self.site_domain
+            parse_time += perf_counter() - parse_start
+            n_parsed += 1
+            yield parsed_info_dict
+
+        run_metrics.record_stage(
+            run_metrics.source_label(self.site_domain),
+            "parse",
+            parse_time,
+            n_records=n_parsed,
+        )
+
+    def parse_rentals(
+        self,
+        rentals=None,
+        L1_keymap: list = puller_configs.ROOM_L1_TARGET_RENTAL_KEYS,
+        Ln_keymap: list = puller_configs.ROOM_Ln_TARGET_RENTAL_KEYS,
+    ):
+        """
+        Shorten extracted rentals into DB friendly format and prepare for upload to DB, as one list.
+        Runs writing to the DB stream iter_parsed_rentals instead, so memory does not grow with the catalogue
+        """
+        logger.info("Starting Room parse")
 
-            truncated_info_dict = self.parse_rental_obj(
-                rental_obj, tmp_l1_keys, tmp_ln_keys
+        shortened_results = list(
+            self.iter_parsed_rentals(
+                rentals=rentals, L1_keymap=L1_keymap, Ln_keymap=Ln_keymap
             )
-            if "specifiekeVoorzieningen" in truncated_info_dict:
-                amenity_details = truncated_info_dict["specifiekeVoorzieningen"]
-                amenity_list = [x["localizedName"] for x in amenity_details]
-                amenity_str = ", ".join(amenity_list)
-                truncated_info_dict["specifiekeVoorzieningen"] = amenity_str
-            truncated_info_dict["domain"] = self.site_domain
-            renamed_info_dict = {
-                self.db_mapping_dict[k]: v for k, v in truncated_info_dict.items()
-            }
-            shortened_results.append(renamed_info_dict)
+        )
 
         logger.info("Finished Room parse")
 
@@ -169,17 +231,30 @@ class Kamernet:
     Queries Kamernet for rental information straight from .NET WebAPI
     """
 
-    def __init__(self, domain: str = puller_configs.KAMERNET_DOMAIN):
+    def __init__(
+        self,
+        domain: str = puller_configs.KAMERNET_DOMAIN,
+        pacing: dict = puller_configs.KAMERNET_PACING,
+        fetch_results: bool = True,
+    ):
+        """
+        With fetch_results False no request is made, for parsing rentals supplied directly
+        """
         self.site_domain = domain
-        search_domain = puller_configs.KAMERNET_SEARCH_DOMAIN
-        init_search_pl = deepcopy(puller_configs.KAMERNET_SEARCH_PL)
-        init_search_pl["pageNo"] = init_search_pl["pageNo"] % 1
-        total_results_count = self.get_total_results_count(
-            total_result_domain=search_domain, total_result_payload=init_search_pl
-        )
-        self.rentals = self.get_total_results(
-            result_search_url=search_domain, total_results=total_results_count
-        )
+        self.pacing = utils.get_pacing_controller(domain, **pacing)
+        self.rentals = []
+        if fetch_results:
+            search_domain = puller_configs.KAMERNET_SEARCH_DOMAIN
+            init_search_pl = deepcopy(puller_configs.KAMERNET_SEARCH_PL)
+            init_search_pl["pageNo"] = init_search_pl["pageNo"] % 1
+            total_results_count, first_page_listings = self.get_total_results_count(
+                total_result_domain=search_domain, total_result_payload=init_search_pl
+            )
+            self.rentals = self.get_total_results(
+                result_search_url=search_domain,
+                total_results=total_results_count,
+                first_page_listings=first_page_listings,
+            )
         mapping_f = open(puller_configs.KAMERNET_DB_KEY_MAP_PATH)
         self.db_mapping_dict = json.load(mapping_f)
         logger.info("Kamernet init. complete")
@@ -188,33 +263,75 @@ class Kamernet:
         self, total_result_domain: str, total_result_payload: dict
     ):
         """
-        Wrapper for getting total number of results from Kamernet .NET WebAPI
+        Wrapper for getting total number of results from Kamernet .NET WebAPI, also returning the first page of listings
         """
-        total_results_count_resp_dict = utils.generic_post_request_wrap(
-            total_result_domain, handler_func=json.loads, pl=total_result_payload
+        total_results_count_resp_dict = self.paced_post(
+            total_result_domain, total_result_payload
         )
         n_total_results = total_results_count_resp_dict["total"]
+        first_page_listings = total_results_count_resp_dict["listings"]
 
-        return n_total_results
+        return n_total_results, first_page_listings
+
+    def paced_post(self, url: str, payload: dict):
+        """
+        POST to the .NET WebAPI in the slot given by the Kamernet pacing controller, feeding it the outcome.
+        Replays read the archive, so are not paced
+        """
+        if response_archive.is_replaying():
+            return utils.generic_post_request_wrap(
+                url, handler_func=json.loads, pl=payload
+            )
+
+        self.pacing.wait()
+        request_start = monotonic()
+        try:
+            resp_dict = utils.generic_post_request_wrap(
+                url, handler_func=json.loads, pl=payload
+            )
+        except (ValueError, OSError):
+            self.pacing.record("error")
+            raise
+        self.pacing.record("ok", monotonic() - request_start)
+
+        return resp_dict
+
+    def get_page_results(self, result_search_url: str, page_i: int):
+        """
+        Pull a single page of rentals under the shared Kamernet pacing
+        """
+        page_payload = deepcopy(puller_configs.KAMERNET_SEARCH_PL)
+        page_payload["pageNo"] = page_payload["pageNo"] % page_i
+        page_results = self.paced_post(result_search_url, page_payload)
+
+        return page_results["listings"]
 
     def get_total_results(
-        self, result_search_url: str, total_results: int, results_per_page: int = 18
+        self,
+        result_search_url: str,
+        total_results: int,
+        first_page_listings: list,
     ):
         """
-        Wrapper for pulling all rentals from Kamernet .NET WebAPI, iterating over page sizes as needed
+        Wrapper for pulling all rentals from Kamernet .NET WebAPI, fetching remaining pages concurrently.
+        Page count is derived from the size of the first page, as the API may cap rowsPerPage below the requested size.
         """
+        results_per_page = len(first_page_listings)
+        if results_per_page == 0:
+            return []
         n_pages_required = ceil(total_results / results_per_page)
-        total_results = []
-        for page_i in range(1, n_pages_required + 1):
-            page_payload = deepcopy(puller_configs.KAMERNET_SEARCH_PL)
-            page_payload["pageNo"] = page_payload["pageNo"] % page_i
-            page_results = utils.generic_post_request_wrap(
-                result_search_url, handler_func=json.loads, pl=page_payload
+        remaining_pages = range(2, n_pages_required + 1)
+
+        with ThreadPoolExecutor(
+            max_workers=puller_configs.KAMERNET_MAX_IN_FLIGHT
+        ) as executor:
+            remaining_page_listings = executor.map(
+                lambda page_i: self.get_page_results(result_search_url, page_i),
+                remaining_pages,
             )
-            page_results_listings = page_results["listings"]
-            total_results += page_results_listings
-
-            sleep(5)
+            total_results = list(first_page_listings)
+            for page_results_listings in remaining_page_listings:
+                total_results += page_results_listings
 
         return total_results
 
@@ -229,16 +346,7 @@ class Kamernet:
         obj_furnishing_id = parsed_results["furnishingId"]
         parsed_results["furnishingId"] = furnishing_map[obj_furnishing_id]
 
-        # Conversion of availability dates back to datetimes
-        if parsed_results["availabilityStartDate"] is not None:
-            avail_start = parsed_results["availabilityStartDate"]
-            avail_start_dt = datetime.strptime(avail_start[:10], "%Y-%m-%d")
-            parsed_results["availabilityStartDate"] = avail_start_dt
-
-        if parsed_results["availabilityEndDate"] is not None:
-            avail_end = parsed_results["availabilityEndDate"]
-            avail_end_dt = datetime.strptime(avail_end[:10], "%Y-%m-%d")
-            parsed_results["availabilityEndDate"] = avail_end_dt
+        # Availability dates stay ISO strings, parsed to datetimes by the normalisation stage
 
         # Specific handling of remap for listingType
         listing_type_map = puller_configs.KAMERNET_LISTING_TYPE_MAP
@@ -265,26 +373,113 @@ class Kamernet:
 
         return parsed_results
 
-    def parse_rentals(self):
+    def parse_rentals(self, rentals: list = None):
         """
-        Parse all rental objects and remap keys for DB upsert
+        Parse all rental objects, self.rentals unless given, and remap keys for DB upsert
         """
+        if rentals is None:
+            rentals = self.rentals
+
         logger.info("Starting Kamernet parse")
+        parse_start = perf_counter()
         full_parsed_rental_objs = [
-            self.parse_rental_obj(x, puller_configs.KAMERNET_L1_KEYS)
-            for x in self.rentals
+            self.parse_rental_obj(x, puller_configs.KAMERNET_L1_KEYS) for x in rentals
         ]
         key_remapped_objs = [
             {self.db_mapping_dict[k]: v for k, v in x.items()}
             for x in full_parsed_rental_objs
         ]
+        run_metrics.record_stage(
+            run_metrics.source_label(self.site_domain),
+            "parse",
+            perf_counter() - parse_start,
+            n_records=len(key_remapped_objs),
+        )
 
         logger.info("Finished Kamernet parse")
+        logger.info("Kamernet pacing: %s" % self.pacing.summary())
 
         return key_remapped_objs
 
 
-class Pararius:
+class DetailPagePuller:
+    """
+    Shared by pullers parsing one detail page per listing link, e.g. Pararius and Funda. Subclasses set
+    n_drivers, driver_kwargs, driver, driver_class, the incremental settings and all_listing_links_unique,
+    and implement parse_rental_obj(listing_link, driver)
+    """
+
+    def url_append_from_link(self, listing_link: str):
+        """
+        Derive the stored url_append key for a listing link, the link itself unless overridden
+        """
+        return listing_link
+
+    def detail_url(self, listing_link: str):
+        """
+        URL of a listing link's detail page
+        """
+        return self.site_domain + listing_link
+
+    def select_links_to_fetch(self):
+        """
+        In incremental mode drop links to listings already stored within the refresh TTL, touching their last seen date.
+        Replays keep only links whose page the archived run fetched, as links it skipped as fresh were never archived
+        """
+        if response_archive.is_replaying():
+            archived_links = [
+                x
+                for x in self.all_listing_links_unique
+                if response_archive.is_archived(self.detail_url(x))
+            ]
+            logger.info(
+                "%s archived listings to replay, %s not fetched by the run"
+                % (
+                    len(archived_links),
+                    len(self.all_listing_links_unique) - len(archived_links),
+                )
+            )
+            return archived_links
+
+        if not self.incremental:
+            return self.all_listing_links_unique
+
+        known_listings = utils.load_known_listings(self.site_domain, db_url=self.db_url)
+        links_to_fetch, fresh_url_appends = utils.split_known_links(
+            self.all_listing_links_unique,
+            self.url_append_from_link,
+            known_listings,
+            self.refresh_ttl,
+        )
+        utils.touch_last_seen(fresh_url_appends, datetime.now(), db_url=self.db_url)
+        logger.info(
+            "%s listings to fetch, %s already known"
+            % (len(links_to_fetch), len(fresh_url_appends))
+        )
+
+        return links_to_fetch
+
+    def parse_rentals_pooled(self):
+        """
+        Parse all listing links across a pool of drivers, reusing self.driver as the first worker
+        """
+        driver_pool = utils.DriverPool(
+            n_workers=self.n_drivers,
+            driver_kwargs=self.driver_kwargs,
+            drivers=[self.driver],
+            driver_class=self.driver_class,
+        )
+        all_parsed = driver_pool.map(
+            lambda listing_link, driver: self.parse_rental_obj(
+                listing_link, driver=driver
+            ),
+            self.select_links_to_fetch(),
+        )
+
+        return all_parsed
+
+
+class Pararius(DetailPagePuller):
     """
     Queries Pararius for rental information using Selenium
     """
@@ -295,19 +490,61 @@ class Pararius:
         headless=True,
         proxy_list: list = None,
         proxy_list_path: str = puller_configs.PROXY_PATH,
+        n_drivers: int = puller_configs.PARARIUS_N_DRIVERS,
+        pacing: dict = puller_configs.PARARIUS_PACING,
+        incremental: bool = True,
+        refresh_ttl_days: float = puller_configs.INCREMENTAL_REFRESH_TTL_DAYS,
+        db_url: str = puller_configs.DB_URL,
+        fetch_results: bool = True,
+        fetch_mode: str = puller_configs.PARARIUS_FETCH_MODE,
     ):
+        """
+        With fetch_results False no driver is started or search made, for parsing pages supplied directly.
+        fetch_mode "http" fetches pages without a browser, falling back to Selenium on JS challenges,
+        and "replay" serves pages from the active response archive
+        """
         self.site_domain = domain
-        self.driver = utils.Driver(
-            headless=headless, proxy_list=proxy_list, proxy_list_path=proxy_list_path
-        )
-        init_search_url = puller_configs.PARARIUS_SEARCH_URL % 1
-        init_search_soup = self.driver.selenium_soup_get(
-            init_search_url, test_element_class="search-list", by_method=By.CLASS_NAME
+        self.driver_class = {
+            "http": utils.HttpDriver,
+            "replay": utils.ReplayDriver,
+        }.get(fetch_mode, utils.Driver)
+        self.n_drivers = n_drivers
+        self.pacing = utils.get_pacing_controller(domain, **pacing)
+        self.incremental = incremental
+        self.refresh_ttl = timedelta(days=refresh_ttl_days)
+        self.db_url = db_url
+        self.driver_kwargs = {
+            "headless": headless,
+            "proxy_list": proxy_list,
+            "proxy_list_path": proxy_list_path,
+            "proxy_target_url": domain,
+        }
+        self.search_strainer = utils.build_soup_strainer(
+            puller_configs.PARARIUS_SEARCH_SUBTREE_CLASSES
         )
-        all_listing_links = self.get_all_listing_links(
-            init_search_soup, puller_configs.PARARIUS_SEARCH_URL
+        self.detail_strainer = utils.build_soup_strainer(
+            puller_configs.PARARIUS_DETAIL_SUBTREE_CLASSES
         )
-        self.all_listing_links_unique = list(set(all_listing_links))
+        self.driver = None
+        self.all_listing_links_unique = []
+        if fetch_results:
+            self.driver = utils.acquire_driver(self.driver_class, self.driver_kwargs)
+            init_search_url = puller_configs.PARARIUS_SEARCH_URL % 1
+            try:
+                init_search_soup = self.driver.soup_get(
+                    init_search_url,
+                    test_element_class="search-list",
+                    by_method=utils.BY_CLASS_NAME,
+                    parse_only=self.search_strainer,
+                )
+                all_listing_links = self.get_all_listing_links(
+                    init_search_soup, puller_configs.PARARIUS_SEARCH_URL
+                )
+            except Exception:
+                # A driver that failed its search is not worth keeping warm
+                self.driver.quit()
+                raise
+            self.all_listing_links_unique = list(set(all_listing_links))
         logger.info("Pararius init. complete")
 
     def get_total_results_count(self, soup):
@@ -343,16 +580,15 @@ class Pararius:
 
         while listing_count < total_listing_n:
             fmted_search_url = search_url % page_i
-            search_soup = self.driver.selenium_soup_get(
+            search_soup = self.driver.soup_get(
                 fmted_search_url,
                 test_element_class="search-list",
-                by_method=By.CLASS_NAME,
+                by_method=utils.BY_CLASS_NAME,
+                parse_only=self.search_strainer,
             )
             listing_urls = self.get_single_page_listings(search_soup)
             all_listing_urls += listing_urls
 
-            sleep(random.randrange(2, 10))
-
             listing_count += len(listing_urls)
             page_i += 1
 
@@ -360,16 +596,19 @@ class Pararius:
 
         return all_listing_urls
 
-    def parse_rental_obj(self, listing_link: str, sleep_buffer: bool = True):
+    def parse_rental_obj(self, listing_link: str, driver=None):
         """
-        Get DOM of and parse relevant data for a single listing URL
+        Get DOM of and parse relevant data for a single listing URL, on the given driver or self.driver
         """
-        listing_full_url = self.site_domain + listing_link
+        if driver is None:
+            driver = self.driver
+        listing_full_url = self.detail_url(listing_link)
         logger.info("Parsing %s" % listing_full_url)
-        listing_soup = self.driver.selenium_soup_get(
+        listing_soup = driver.soup_get(
             listing_full_url,
             test_element_class="listing-detail-summary__title",
-            by_method=By.CLASS_NAME,
+            by_method=utils.BY_CLASS_NAME,
+            parse_only=self.detail_strainer,
         )
 
         listing_dict = {}
@@ -429,41 +668,40 @@ class Pararius:
         available_idx = 3
         furnished_idx = 4
 
-        price_value = transfer_lineitem_raw_texts[price_idx]
-        if "Price on request" in price_value:
-            listing_dict["rent_total"] = -1
-        else:
-            price_re_find = re.findall("\d*", price_value)
-            price_num = int("".join([x for x in price_re_find if x != ""]))
-            listing_dict["rent_total"] = price_num
+        # Price text, e.g. "€1,250 per month", is read as a number by the normalisation stage
+        listing_dict["rent_total"] = transfer_lineitem_raw_texts[price_idx]
 
+        relative_date_cols = []
         posted_value = transfer_lineitem_raw_texts[posted_idx]
         if "weeks" in posted_value:
             num_weeks = int(re.findall("\d*", posted_value)[0])
-            today_date = datetime.now()
+            today_date = start_of_today()
             time_diff = timedelta(weeks=num_weeks)
             posted_date = today_date - time_diff
+            relative_date_cols.append("publish_date")
         elif "months" in posted_value:
             num_months = int(re.findall("\d*", posted_value)[0])
-            today_date = datetime.now()
+            today_date = start_of_today()
             weeks_constant = 4.33
             time_diff = timedelta(weeks=num_months * weeks_constant)
             posted_date = today_date - time_diff
+            relative_date_cols.append("publish_date")
         else:
-            posted_date = datetime.strptime(posted_value, "%d-%m-%Y")
+            # DD-MM-YYYY, parsed by the normalisation stage
+            posted_date = posted_value
         listing_dict["publish_date"] = posted_date
 
         available_date = transfer_lineitem_raw_texts[available_idx]
         if "From" in available_date:
-            available_date_split = available_date.split(" ")
-            available_date_value = datetime.strptime(
-                available_date_split[1], "%d-%m-%Y"
-            )
+            available_date_value = available_date.split(" ")[1]
         elif available_date == "Immediately":
-            available_date_value = datetime.now()
+            available_date_value = start_of_today()
+            relative_date_cols.append("available_date")
         elif available_date == "In consultation":
-            available_date_value = datetime.now()
+            available_date_value = start_of_today()
+            relative_date_cols.append("available_date")
         listing_dict["available_date"] = available_date_value
+        listing_dict[utils.RELATIVE_DATE_COLS_KEY] = tuple(relative_date_cols)
 
         furnished_info = transfer_lineitem_raw_texts[furnished_idx]
         listing_dict["additional_info"] = [furnished_info]
@@ -493,15 +731,12 @@ class Pararius:
         property_obj = listing_soup.find("dd", attrs=proprety_type_attrs)
         if property_obj is not None:
             property_type = property_obj.find("span").text
-            listing_dict["building_Type"] = property_type
+            listing_dict["building_type"] = property_type
 
         listing_dict["additional_costs"] = None
         listing_dict["additional_info"] = ";".join(listing_dict["additional_info"])
         listing_dict["domain"] = self.site_domain
 
-        if sleep_buffer:
-            sleep(random.randint(2, 10))
-
         return listing_dict
 
     def parse_rentals(self):
@@ -509,15 +744,20 @@ class Pararius:
         Executor for parsing all listings in self.all_listing_links_unique
         """
         logger.info("Starting Pararius parse")
-        all_parsed = [self.parse_rental_obj(x) for x in self.all_listing_links_unique]
+        try:
+            all_parsed = self.parse_rentals_pooled()
+        finally:
+            if self.driver is not None:
+                utils.release_driver(self.driver)
         stripped_parsed_listings = [x for x in all_parsed if x is not None]
 
         logger.info("Finished Pararius parse")
+        logger.info("Pararius pacing: %s" % self.pacing.summary())
 
         return stripped_parsed_listings
 
 
-class Funda:
+class Funda(DetailPagePuller):
     """
     Queries Funda for rental information using Selenium
     """
@@ -528,21 +768,62 @@ class Funda:
         headless=True,
         proxy_list: list = None,
         proxy_list_path: str = puller_configs.PROXY_PATH,
+        n_drivers: int = puller_configs.FUNDA_N_DRIVERS,
+        pacing: dict = puller_configs.FUNDA_PACING,
+        incremental: bool = True,
+        refresh_ttl_days: float = puller_configs.INCREMENTAL_REFRESH_TTL_DAYS,
+        db_url: str = puller_configs.DB_URL,
+        fetch_results: bool = True,
+        fetch_mode: str = puller_configs.FUNDA_FETCH_MODE,
     ):
+        """
+        With fetch_results False no driver is started or search made, for parsing pages supplied directly.
+        fetch_mode "http" fetches pages without a browser, falling back to Selenium on JS challenges,
+        and "replay" serves pages from the active response archive
+        """
         self.site_domain = domain
-        self.driver = utils.Driver(
-            headless=headless, proxy_list=proxy_list, proxy_list_path=proxy_list_path
-        )
-        init_search_url = puller_configs.FUNDA_SEARCH_URL % 1
-        init_search_soup = self.driver.selenium_soup_get(
-            init_search_url,
-            "//div[@data-test-id='search-result-item']",
-            by_method=By.XPATH,
+        self.driver_class = {
+            "http": utils.HttpDriver,
+            "replay": utils.ReplayDriver,
+        }.get(fetch_mode, utils.Driver)
+        self.n_drivers = n_drivers
+        self.pacing = utils.get_pacing_controller(domain, **pacing)
+        self.incremental = incremental
+        self.refresh_ttl = timedelta(days=refresh_ttl_days)
+        self.db_url = db_url
+        self.driver_kwargs = {
+            "headless": headless,
+            "proxy_list": proxy_list,
+            "proxy_list_path": proxy_list_path,
+            "proxy_target_url": domain,
+        }
+        self.search_strainer = utils.build_soup_strainer(
+            puller_configs.FUNDA_SEARCH_SUBTREE_CLASSES,
+            puller_configs.FUNDA_SEARCH_SUBTREE_ATTRS,
         )
-        all_listing_links = self.get_all_listing_links(
-            init_search_soup, puller_configs.FUNDA_SEARCH_URL
+        self.detail_strainer = utils.build_soup_strainer(
+            puller_configs.FUNDA_DETAIL_SUBTREE_CLASSES
         )
-        self.all_listing_links_unique = list(set(all_listing_links))
+        self.driver = None
+        self.all_listing_links_unique = []
+        if fetch_results:
+            self.driver = utils.acquire_driver(self.driver_class, self.driver_kwargs)
+            init_search_url = puller_configs.FUNDA_SEARCH_URL % 1
+            try:
+                init_search_soup = self.driver.soup_get(
+                    init_search_url,
+                    "//div[@data-test-id='search-result-item']",
+                    by_method=utils.BY_XPATH,
+                    parse_only=self.search_strainer,
+                )
+                all_listing_links = self.get_all_listing_links(
+                    init_search_soup, puller_configs.FUNDA_SEARCH_URL
+                )
+            except Exception:
+                # A driver that failed its search is not worth keeping warm
+                self.driver.quit()
+                raise
+            self.all_listing_links_unique = list(set(all_listing_links))
         logger.info("Funda init. complete")
 
     def get_total_results_count(self, soup):
@@ -570,10 +851,11 @@ class Funda:
 
         for page_num in range(1, page_count + 1):
             page_search_url = search_url % page_num
-            page_soup = self.driver.selenium_soup_get(
+            page_soup = self.driver.soup_get(
                 page_search_url,
                 "//div[@data-test-id='search-result-item']",
-                by_method=By.XPATH,
+                by_method=utils.BY_XPATH,
+                parse_only=self.search_strainer,
             )
             result_divs = page_soup.find_all(
                 "div", attrs={"data-test-id": "search-result-item"}
@@ -587,31 +869,105 @@ class Funda:
 
                 result_links.append(listing_link)
 
-            sleep(random.randrange(3, 10))
-
         return result_links
 
-    def parse_rental_obj(self, listing_link: str, sleep_buffer: bool = True):
+    def parse_rental_obj(self, listing_link: str, driver=None):
         """
-        Get DOM of and parse relevant data for a single listing URL
+        Get and parse a single listing URL, on the given driver or self.driver. The page's embedded JSON-LD is
+        read first, walking the DOM only when it lacks the listing's address or price
         """
-        # Insert en for english results
+        if driver is None:
+            driver = self.driver
         logger.info("Parsing %s" % listing_link)
-        en_swapped_listing_link = listing_link.replace(
-            "https://www.funda.nl/", "https://www.funda.nl/en/"
-        )
-        # bare_driver_instance = self.driver.driver
-        result_soup = self.driver.selenium_soup_get(
-            en_swapped_listing_link,
+        page_source = driver.source_get(
+            self.detail_url(listing_link),
             "//span[@class='object-header__title']",
-            by_method=By.XPATH,
+            by_method=utils.BY_XPATH,
         )
 
-        listing_dict = {}
+        with run_metrics.stage_timer(
+            run_metrics.source_label(self.site_domain), "parse"
+        ):
+            listing_dict = self.parse_json_ld(page_source, listing_link)
+            if listing_dict is None:
+                result_soup = utils.soup_from_source(
+                    page_source,
+                    parse_only=self.detail_strainer,
+                    html_parser=driver.html_parser,
+                )
+                listing_dict = self.parse_rental_soup(result_soup)
+
+        # Funda only ever gives availability as of today
+        if listing_dict["available_date"] is not None:
+            listing_dict[utils.RELATIVE_DATE_COLS_KEY] = ("available_date",)
+        domain_stripped_url = self.url_append_from_link(listing_link)
+        listing_dict["url_append"] = domain_stripped_url
+        listing_dict["domain"] = self.site_domain
+        listing_dict["domain_id"] = domain_stripped_url.split("-")[1]
+
+        return listing_dict
+
+    def parse_json_ld(self, page_source: str, listing_link: str):
+        """
+        Map the listing's JSON-LD object, the one carrying its postal address, straight to Listing columns.
+        Returns None when the page has no such object, or it lacks the address, price or a known availability
+        """
+        listing_obj = next(
+            (
+                x
+                for x in utils.extract_json_ld(page_source)
+                if isinstance(x.get("address"), dict)
+            ),
+            None,
+        )
+        if listing_obj is None:
+            return None
+
+        address = listing_obj["address"]
+        offers = listing_obj.get("offers")
+        if isinstance(offers, list):
+            offers = offers[0] if len(offers) > 0 else None
+        if not isinstance(offers, dict):
+            return None
+        street_address_match = FUNDA_STREET_ADDRESS_PATTERN.match(
+            str(address.get("streetAddress", "")).strip()
+        )
+        if (
+            street_address_match is None
+            or address.get("postalCode") is None
+            or offers.get("price") is None
+        ):
+            return None
+
+        availability = str(offers.get("availability", "")).rsplit("/", 1)[-1]
+        if availability not in FUNDA_JSON_LD_AVAILABLE:
+            return None
+
+        floor_size = listing_obj.get("floorSize")
+        area_dwelling = None
+        if isinstance(floor_size, dict):
+            area_dwelling = floor_size.get("value")
+        available_date = None
+        if FUNDA_JSON_LD_AVAILABLE[availability]:
+            available_date = start_of_today()
+
+        return {
+            "postal_code": address["postalCode"],
+            "street": street_address_match.group(1),
+            "house_number": street_address_match.group(2),
+            "house_addition": street_address_match.group(3) or None,
+            "locale": address.get("addressLocality"),
+            "rent_buy": "Rent" if "/huur/" in listing_link else "Buy",
+            "available_date": available_date,
+            "area_dwelling": area_dwelling,
+            "rent_total": offers["price"],
+        }
 
-        domain_stripped_url = listing_link.split("leiden")[1]
-        url_append = listing_link.split("leiden")[1]
-        domain_id = domain_stripped_url.split("-")[1]
+    def parse_rental_soup(self, result_soup):
+        """
+        Fallback walking the detail page DOM for pages without usable JSON-LD
+        """
+        listing_dict = {}
 
         # Street/house number/addition
         house_info_obj = result_soup.find_all("span", "object-header__title")[0]
@@ -678,9 +1034,9 @@ class Funda:
                 rent_buy = "Buy"
 
             if ownership_table_dict["Status"].replace("\n", "") == "Available":
-                available_date = datetime.now()
+                available_date = start_of_today()
             elif ownership_table_dict["Status"].replace("\n", "") == "Beschikbaar":
-                available_date = datetime.now()
+                available_date = start_of_today()
             else:
                 available_date = None
 
@@ -688,13 +1044,12 @@ class Funda:
                 rent_total_str = ownership_table_dict["Rental price "]
             except KeyError:
                 rent_total_str = ownership_table_dict["Huurprijs "]
-            rent_numeric_match = re.search("(\d+\.||\.)*\d{3}", rent_total_str).group()
-            rent_total = int(re.sub("\,|\.", "", rent_numeric_match))
+            rent_total = rent_total_str
 
         else:
             feature_table = tables[0]
             rent_buy = "Rent"
-            available_date = datetime.now()
+            available_date = start_of_today()
 
             feature_table = tables[0]
             feature_table_keys = [x.text for x in feature_table.find_all("dt")]
@@ -713,12 +1068,8 @@ class Funda:
                 rent_total_str = feature_table_dict["Rental price "]
             except KeyError:
                 rent_total_str = feature_table_dict["Huurprijs "]
-            rent_numeric_match = re.search("(\d+\.||\.)*\d{3}", rent_total_str).group()
-            rent_total = int(re.sub("\,|\.", "", rent_numeric_match))
+            rent_total = rent_total_str
 
-        listing_dict["url_append"] = url_append
-        listing_dict["domain"] = self.site_domain
-        listing_dict["domain_id"] = domain_id
         listing_dict["postal_code"] = postal_code
         listing_dict["street"] = street
         listing_dict["house_number"] = house_number
@@ -727,18 +1078,34 @@ class Funda:
         listing_dict["rent_buy"] = rent_buy
         listing_dict["available_date"] = available_date
         listing_dict["area_dwelling"] = area_dwelling
+        # Price text, read as a number by the normalisation stage
         listing_dict["rent_total"] = rent_total
 
-        if sleep_buffer:
-            sleep(random.randint(2, 5))
-
         return listing_dict
 
+    def url_append_from_link(self, listing_link: str):
+        """
+        Funda listings are keyed by their link's path after the city
+        """
+        return listing_link.split("leiden")[1]
+
+    def detail_url(self, listing_link: str):
+        """
+        Funda links are absolute, en is inserted for english results
+        """
+        return listing_link.replace("https://www.funda.nl/", "https://www.funda.nl/en/")
+
     def parse_rentals(self):
         """
         Executor for parsing all listings in self.all_listing_links_unique
         """
         logger.info("Starting Funda parse")
-        all_parsed = [self.parse_rental_obj(x) for x in self.all_listing_links_unique]
+        try:
+            all_parsed = self.parse_rentals_pooled()
+        finally:
+            if self.driver is not None:
+                utils.release_driver(self.driver)
+        stripped_parsed_listings = [x for x in all_parsed if x is not None]
         logger.info("Finished Funda parse")
-        return all_parsed
+        logger.info("Funda pacing: %s" % self.pacing.summary())
+        return stripped_parsed_listings
@@ -0,0 +1,44 @@
+# Refreshes the cached desktop Firefox user agent list read by utils.UserAgentPool, out of band of puller runs.
+# Run after upgrading fake_useragent: python3 refresh_user_agents.py [--output PATH]
+
+import argparse
+from fake_useragent.utils import load
+import logging
+import os
+import utils
+
+
+logger = logging.getLogger(__name__)
+
+
+def refresh_user_agent_cache(cache_path: str = utils.USER_AGENT_CACHE_PATH):
+    """
+    Write fake_useragent's bundled desktop Firefox user agents, most common first, to the cache file
+    """
+    browser_data = load() or []
+    firefox_data = [
+        x
+        for x in browser_data
+        if x.get("browser") == "firefox" and utils.is_desktop_firefox(x["useragent"])
+    ]
+    firefox_data.sort(key=lambda x: -x.get("percent", 0))
+    user_agents = list(dict.fromkeys(x["useragent"] for x in firefox_data))
+    if len(user_agents) == 0:
+        raise ValueError("No desktop Firefox user agents in fake_useragent data")
+
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir != "":
+        os.makedirs(cache_dir, exist_ok=True)
+    tmp_cache_path = "%s.%s.tmp" % (cache_path, os.getpid())
+    with open(tmp_cache_path, "w") as cache_file:
+        cache_file.write("".join("%s\n" % x for x in user_agents))
+    os.replace(tmp_cache_path, cache_path)
+    logger.info("Wrote %s user agents to %s" % (len(user_agents), cache_path))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--output", default=utils.USER_AGENT_CACHE_PATH)
+    args = arg_parser.parse_args()
+    refresh_user_agent_cache(args.output)
@@ -1,21 +1,34 @@
-from bs4 import BeautifulSoup
-from db.db_tables import Listing
-from fake_useragent import UserAgent
+from archive import response_archive
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from db.db_init import register_sqlite_pragmas
+from db.db_tables import Listing, ListingHistory
+import hashlib
+from itertools import islice
+from importlib.util import find_spec
+import json
 import logging
-from multiprocessing import Process, Queue
+from metrics import run_metrics
+import os
+import queue
 import random
+import re
 import requests
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.select import Select
-from selenium.webdriver.support.ui import WebDriverWait
-from sqlalchemy import create_engine, insert, select, update
+from requests.adapters import HTTPAdapter
+from sqlalchemy import bindparam, create_engine, func, select, update
+import threading
+from time import monotonic, perf_counter, sleep
+from urllib.parse import urlparse
 
 
 logger = logging.getLogger(__name__)
 
+# Selenium and BeautifulSoup are imported where first used, so API only runs never load them.
+# Selenium's By locator strategies as plain strings, usable without importing Selenium
+BY_CLASS_NAME = "class name"
+BY_XPATH = "xpath"
+
 
 def filter_comp(var, val, comp):
     if comp == "eq":
@@ -32,33 +45,604 @@ def filter_comp(var, val, comp):
     return False
 
 
+DB_ENGINES = {}
+
+
+def get_engine(db_url: str = "sqlite:///db/listings.db"):
+    """
+    Return a shared engine per DB URL rather than creating one on every call
+    """
+    engine = DB_ENGINES.get(db_url)
+    if engine is None:
+        engine = create_engine(db_url)
+        register_sqlite_pragmas(engine)
+        DB_ENGINES[db_url] = engine
+
+    return engine
+
+
+def dialect_insert(engine, table):
+    """
+    Build a dialect specific INSERT supporting ON CONFLICT for the engine in use
+    """
+    dialect_name = engine.dialect.name
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        return sqlite_insert(table)
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+        return postgresql_insert(table)
+
+    raise ValueError("Bulk upsert not supported for dialect %s" % dialect_name)
+
+
+def db_value_equal(new_value, db_value):
+    """
+    Compare an incoming value against its stored representation
+    """
+    if new_value is None or db_value is None:
+        return new_value is db_value
+    if isinstance(new_value, datetime):
+        return str(new_value) == str(db_value)
+    if isinstance(new_value, bool) or isinstance(db_value, bool):
+        return bool(new_value) == bool(db_value)
+    if isinstance(new_value, (int, float)) and isinstance(db_value, (int, float)):
+        return new_value == db_value
+
+    return str(new_value) == str(db_value)
+
+
+# Bookkeeping columns of a listing, left out of its content hash
+LISTING_UNHASHED_COLS = ("upload_date", "last_seen_date", "checked_date")
+# Columns still written when a listing's content is unchanged
+LISTING_TOUCH_COLS = ("last_seen_date", "checked_date")
+# Record key naming the date columns a source only gave relative to today, e.g. "Immediately" or "2 weeks ago",
+# which keep their stored value so refetching the listing on a later day is not a change
+RELATIVE_DATE_COLS_KEY = "relative_date_cols"
+
+
+def content_hash(data_dict: dict, unhashed_cols: tuple = ()):
+    """
+    Stable hash of a record's content, ignoring the unhashed columns
+    """
+    content = {k: v for k, v in data_dict.items() if k not in unhashed_cols}
+    content_json = json.dumps(content, sort_keys=True, default=str)
+
+    return hashlib.blake2b(content_json.encode(), digest_size=16).hexdigest()
+
+
+def history_value(value):
+    return None if value is None else str(value)
+
+
 def push_to_db(
     data,
     push_data_pk: str = "url_append",
     table=Listing,
     table_pk=Listing.url_append,
     db_url="sqlite:///db/listings.db",
+    chunk_size: int = 500,
+    content_hash_col: str = None,
+    unhashed_cols: tuple = (),
+    touch_cols: tuple = (),
+    history_table=None,
+    observed_at: datetime = None,
+    relative_cols_key: str = None,
 ):
-    engine = create_engine(db_url)
+    """
+    Bulk upsert records in chunked INSERT ... ON CONFLICT DO UPDATE statements in one transaction.
+    Data can be any iterable, including a generator of parsed listings. Returns counts of inserted, updated and unchanged records.
+
+    With a content_hash_col, records are hashed without their unhashed_cols and compared against the stored hash.
+    Unchanged records only have their touch_cols written, changed ones are rewritten and, with a history_table,
+    append a row per changed field observed at observed_at. Columns a record lists under relative_cols_key
+    keep their stored value, if any
+    """
+    upsert_counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    table_obj = table.__table__
+    pk_col_name = table_pk.key
+    observed_at = observed_at or datetime.now()
+    skip_compare_cols = set(unhashed_cols) | {content_hash_col}
+
+    # Data may be a generator, consume it a chunk at a time
+    data_iter = iter(data)
+    engine = get_engine(db_url)
+    with engine.begin() as conn:
+        while True:
+            # Later duplicates of a key win, as with sequential upserts
+            deduped_chunk = {}
+            for data_dict in islice(data_iter, chunk_size):
+                deduped_chunk[data_dict[push_data_pk]] = data_dict
+            if len(deduped_chunk) == 0:
+                break
+            chunk = list(deduped_chunk.values())
+            chunk_pks = [x[push_data_pk] for x in chunk]
+
+            existing_stmt = select(table_obj).where(table_pk.in_(chunk_pks))
+            existing_rows = {
+                x[pk_col_name]: x for x in conn.execute(existing_stmt).mappings()
+            }
+
+            # Group by key set so each executemany batch shares one statement
+            keyed_batches = {}
+            touch_batch = []
+            history_rows = []
+            for data_dict in chunk:
+                existing_row = existing_rows.get(data_dict[push_data_pk])
+                data_dict = dict(data_dict)
+                if relative_cols_key is not None:
+                    for k in data_dict.pop(relative_cols_key, ()):
+                        if existing_row is not None and existing_row[k] is not None:
+                            data_dict[k] = existing_row[k]
+                if content_hash_col is not None:
+                    data_dict[content_hash_col] = content_hash(data_dict, unhashed_cols)
+                if existing_row is None:
+                    upsert_counts["inserted"] += 1
+                elif content_hash_col is None:
+                    if all(
+                        db_value_equal(v, existing_row[k]) for k, v in data_dict.items()
+                    ):
+                        upsert_counts["unchanged"] += 1
+                        continue
+                    upsert_counts["updated"] += 1
+                elif existing_row[content_hash_col] == data_dict[content_hash_col]:
+                    upsert_counts["unchanged"] += 1
+                    touch_batch.append(data_dict)
+                    continue
+                else:
+                    # Rows stored before hashing, or whose hash changed, are compared field by field
+                    changed_fields = [
+                        k
+                        for k, v in data_dict.items()
+                        if k not in skip_compare_cols
+                        and not db_value_equal(v, existing_row[k])
+                    ]
+                    if len(changed_fields) == 0:
+                        upsert_counts["unchanged"] += 1
+                        touch_batch.append(data_dict)
+                        continue
+                    upsert_counts["updated"] += 1
+                    if history_table is not None:
+                        history_rows.extend(
+                            {
+                                "url_append": data_dict[push_data_pk],
+                                "observed_at": observed_at,
+                                "field_name": k,
+                                "old_value": history_value(existing_row[k]),
+                                "new_value": history_value(data_dict[k]),
+                            }
+                            for k in changed_fields
+                        )
+                batch_keys = tuple(sorted(data_dict.keys()))
+                keyed_batches.setdefault(batch_keys, []).append(data_dict)
+
+            for batch_keys, batch in keyed_batches.items():
+                upsert_stmt = dialect_insert(engine, table_obj)
+                update_cols = {
+                    k: upsert_stmt.excluded[k] for k in batch_keys if k != pk_col_name
+                }
+                if len(update_cols) == 0:
+                    upsert_stmt = upsert_stmt.on_conflict_do_nothing(
+                        index_elements=[pk_col_name]
+                    )
+                else:
+                    upsert_stmt = upsert_stmt.on_conflict_do_update(
+                        index_elements=[pk_col_name], set_=update_cols
+                    )
+                conn.execute(upsert_stmt, batch)
+
+            if len(touch_batch) > 0:
+                # Also sets the hash, which rows stored before hashing lack
+                written_cols = [x for x in touch_cols if x in touch_batch[0]] + [
+                    content_hash_col
+                ]
+                touch_stmt = (
+                    update(table_obj)
+                    .where(table_pk == bindparam("touch_pk"))
+                    .values({k: bindparam("touch_%s" % k) for k in written_cols})
+                )
+                conn.execute(
+                    touch_stmt,
+                    [
+                        dict(
+                            touch_pk=x[push_data_pk],
+                            **{"touch_%s" % k: x.get(k) for k in written_cols},
+                        )
+                        for x in touch_batch
+                    ],
+                )
+            if len(history_rows) > 0:
+                conn.execute(
+                    dialect_insert(
+                        engine, history_table.__table__
+                    ).on_conflict_do_nothing(),
+                    history_rows,
+                )
+
+    logger.info(
+        "Upserted into %s: %s inserted, %s updated, %s unchanged"
+        % (
+            table_obj.name,
+            upsert_counts["inserted"],
+            upsert_counts["updated"],
+            upsert_counts["unchanged"],
+        )
+    )
+
+    return upsert_counts
+
+
+def push_listings_to_db(
+    data, db_url: str = "sqlite:///db/listings.db", observed_at: datetime = None
+):
+    """
+    Upsert listings, writing only those whose content hash changed and logging their changed fields to listing_history.
+    Dates a listing only gave relative to today keep their stored value
+    """
+    return push_to_db(
+        data,
+        db_url=db_url,
+        content_hash_col="content_hash",
+        unhashed_cols=LISTING_UNHASHED_COLS,
+        touch_cols=LISTING_TOUCH_COLS,
+        history_table=ListingHistory,
+        observed_at=observed_at,
+        relative_cols_key=RELATIVE_DATE_COLS_KEY,
+    )
+
+
+def insert_to_db(
+    data: list,
+    table=Listing,
+    db_url="sqlite:///db/listings.db",
+    ignore_conflicts: bool = True,
+):
+    """
+    Write records to an append only table in a single executemany INSERT, skipping records
+    whose primary key is already stored when ignore_conflicts
+    """
+    if len(data) == 0:
+        return
+
+    engine = get_engine(db_url)
+    insert_stmt = dialect_insert(engine, table.__table__)
+    if ignore_conflicts:
+        insert_stmt = insert_stmt.on_conflict_do_nothing()
+    with engine.begin() as conn:
+        conn.execute(insert_stmt, data)
+
+    logger.info("Inserted %s records into %s" % (len(data), table.__table__.name))
+
+
+def load_known_listings(domain: str, db_url: str = "sqlite:///db/listings.db"):
+    """
+    Load url_append keys of a domain's stored listings mapped to when they were last fully fetched
+    """
+    engine = get_engine(db_url)
+    known_stmt = select(
+        Listing.url_append, func.coalesce(Listing.checked_date, Listing.upload_date)
+    ).where(Listing.domain == domain)
     with engine.connect() as conn:
-        for data_dict in data:
-            data_pk = data_dict[push_data_pk]
-            query_stmt = select(table).where(table_pk == data_pk)
-            query_result = conn.execute(query_stmt)
-            is_exists = query_result.first()
-            if not is_exists:
-                insert_statement = insert(table)
-                conn.execute(insert_statement, data_dict)
-                conn.commit()
+        known_listings = {
+            url_append: checked_date
+            for url_append, checked_date in conn.execute(known_stmt)
+        }
+
+    return known_listings
+
+
+def touch_last_seen(
+    url_appends: list,
+    seen_date: datetime,
+    db_url: str = "sqlite:///db/listings.db",
+    chunk_size: int = 500,
+):
+    """
+    Mark stored listings as seen without rewriting the rest of the row
+    """
+    engine = get_engine(db_url)
+    with engine.begin() as conn:
+        for chunk_start in range(0, len(url_appends), chunk_size):
+            chunk = url_appends[chunk_start : chunk_start + chunk_size]
+            touch_stmt = (
+                update(Listing)
+                .where(Listing.url_append.in_(chunk))
+                .values(last_seen_date=seen_date)
+            )
+            conn.execute(touch_stmt)
+
+
+def split_known_links(
+    links: list, url_append_func, known_listings: dict, refresh_ttl: timedelta
+):
+    """
+    Split links into those needing a fetch (new, or last fetched before the refresh TTL) and
+    url_append keys of listings already stored recently enough to skip
+    """
+    refresh_cutoff = datetime.now() - refresh_ttl
+    links_to_fetch = []
+    fresh_url_appends = []
+    for link in links:
+        url_append = url_append_func(link)
+        last_fetched = known_listings.get(url_append)
+        if last_fetched is not None and (
+            datetime.fromisoformat(str(last_fetched)) > refresh_cutoff
+        ):
+            fresh_url_appends.append(url_append)
+        else:
+            links_to_fetch.append(link)
+
+    return links_to_fetch, fresh_url_appends
+
+
+class PacingController:
+    """
+    AIMD pacing of requests to one domain. Healthy fast responses shrink the delay additively,
+    errors, timeouts, throttling and slow responses grow it multiplicatively
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        initial_delay: float = 5.0,
+        min_delay: float = 1.0,
+        max_delay: float = 120.0,
+        decrease_step: float = 0.5,
+        increase_factor: float = 2.0,
+        slow_latency: float = 15.0,
+        jitter: float = 0.25,
+    ):
+        self.domain = domain
+        self.delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.decrease_step = decrease_step
+        self.increase_factor = increase_factor
+        self.slow_latency = slow_latency
+        self.jitter = jitter
+        self.next_request_time = monotonic()
+        self.pacing_lock = threading.Lock()
+        self.stats = {
+            "ok": 0,
+            "slow": 0,
+            "error": 0,
+            "timeout": 0,
+            "throttled": 0,
+            "total_wait": 0.0,
+        }
+
+    def wait(self):
+        """
+        Block until this domain's next request slot, spacing requests from all workers by the current delay
+        """
+        with self.pacing_lock:
+            now = monotonic()
+            request_time = max(now, self.next_request_time)
+            jittered_delay = self.delay * random.uniform(
+                1 - self.jitter, 1 + self.jitter
+            )
+            self.next_request_time = request_time + jittered_delay
+            wait_time = request_time - now
+            self.stats["total_wait"] += wait_time
+        run_metrics.record_stage(
+            run_metrics.source_label(self.domain), "sleep", wait_time
+        )
+        if wait_time > 0:
+            sleep(wait_time)
+
+    def record(self, outcome: str = "ok", latency: float = None):
+        """
+        Adapt the delay to a request outcome: ok, error, timeout or throttled
+        """
+        if outcome == "ok" and latency is not None and latency > self.slow_latency:
+            outcome = "slow"
+        with self.pacing_lock:
+            self.stats[outcome] += 1
+            previous_delay = self.delay
+            if outcome == "ok":
+                self.delay = max(self.min_delay, self.delay - self.decrease_step)
             else:
-                update_statement = update(table).where(table_pk == data_pk)
-                conn.execute(update_statement, data_dict)
-        conn.close()
-    return None
+                self.delay = min(self.max_delay, self.delay * self.increase_factor)
+        if outcome != "ok":
+            logger.info(
+                "Pacing %s: %s response, delay %.1fs -> %.1fs"
+                % (self.domain, outcome, previous_delay, self.delay)
+            )
+
+    def summary(self):
+        with self.pacing_lock:
+            pacing_summary = dict(self.stats)
+            pacing_summary["delay"] = self.delay
+
+        return pacing_summary
+
+
+PACING_CONTROLLERS = {}
+PACING_CONTROLLERS_LOCK = threading.Lock()
+
+
+def get_pacing_controller(url: str, **pacing_kwargs):
+    """
+    Return the shared pacing controller for the domain of a URL, creating it with pacing_kwargs on first use
+    """
+    domain = urlparse(url).netloc
+    with PACING_CONTROLLERS_LOCK:
+        pacing_controller = PACING_CONTROLLERS.get(domain)
+        if pacing_controller is None:
+            pacing_controller = PacingController(domain, **pacing_kwargs)
+            PACING_CONTROLLERS[domain] = pacing_controller
+
+    return pacing_controller
+
+
+def get_pacing_stats():
+    """
+    Summarise pacing state per domain
+    """
+    with PACING_CONTROLLERS_LOCK:
+        pacing_controllers = dict(PACING_CONTROLLERS)
+
+    return {k: v.summary() for k, v in pacing_controllers.items()}
+
+
+HTTP_SESSIONS = {}
+HTTP_SESSIONS_LOCK = threading.Lock()
+HTTP_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+HTTP_DEFAULT_HEADERS = {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+
+REQUEST_STATS = {}
+REQUEST_STATS_LOCK = threading.Lock()
+
+
+def get_http_session(url: str, pool_maxsize: int = 10):
+    """
+    Return the shared keep-alive session for the domain of a URL, creating it on first use
+    """
+    domain = urlparse(url).netloc
+    with HTTP_SESSIONS_LOCK:
+        session = HTTP_SESSIONS.get(domain)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HTTP_DEFAULT_HEADERS)
+            HTTP_SESSIONS[domain] = session
+
+    return session
+
+
+def record_request_stats(url: str, latency: float, is_error: bool, is_retry: bool):
+    """
+    Track request count, latency, errors and retries per domain
+    """
+    domain = urlparse(url).netloc
+    with REQUEST_STATS_LOCK:
+        domain_stats = REQUEST_STATS.setdefault(
+            domain,
+            {
+                "requests": 0,
+                "errors": 0,
+                "retries": 0,
+                "total_latency": 0.0,
+                "max_latency": 0.0,
+            },
+        )
+        domain_stats["requests"] += 1
+        domain_stats["errors"] += int(is_error)
+        domain_stats["retries"] += int(is_retry)
+        domain_stats["total_latency"] += latency
+        domain_stats["max_latency"] = max(domain_stats["max_latency"], latency)
+
+
+def get_request_stats():
+    """
+    Summarise recorded request stats per domain
+    """
+    with REQUEST_STATS_LOCK:
+        request_stats = {}
+        for domain, domain_stats in REQUEST_STATS.items():
+            summary = dict(domain_stats)
+            summary["mean_latency"] = (
+                domain_stats["total_latency"] / domain_stats["requests"]
+            )
+            request_stats[domain] = summary
 
+    return request_stats
 
-def generic_get_request_wrap(url, handler_func):
-    response = requests.get(url)
+
+def retry_after_delay(response):
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_date.timestamp() - datetime.now().timestamp())
+
+
+def request_with_retries(
+    method: str,
+    url: str,
+    max_retries: int = 4,
+    backoff_base: float = 1.0,
+    backoff_max: float = 60.0,
+    timeout: float = 30.0,
+    session=None,
+    **request_kwargs,
+):
+    """
+    Issue a request through the pooled domain session (or the session given), retrying 429/5xx and connection errors
+    with exponential backoff and full jitter, honouring Retry-After when given. A Retry-After beyond backoff_max
+    returns the failed response rather than sleeping through it
+    """
+    if session is None:
+        session = get_http_session(url)
+    metrics_source = run_metrics.source_label(url)
+    attempt = 0
+    while True:
+        request_start = monotonic()
+        try:
+            response = session.request(method, url, timeout=timeout, **request_kwargs)
+        except (requests.ConnectionError, requests.Timeout) as request_error:
+            request_latency = monotonic() - request_start
+            record_request_stats(url, request_latency, True, attempt > 0)
+            run_metrics.record_stage(
+                metrics_source, "fetch", request_latency, is_error=True
+            )
+            if attempt >= max_retries:
+                raise
+            logger.warning("Request error at URL %s: %s" % (url, request_error))
+            retry_delay = None
+        else:
+            request_latency = monotonic() - request_start
+            is_retryable = response.status_code in HTTP_RETRY_STATUS_CODES
+            record_request_stats(url, request_latency, is_retryable, attempt > 0)
+            run_metrics.record_stage(
+                metrics_source,
+                "fetch",
+                request_latency,
+                is_error=response.status_code != 200,
+            )
+            if not is_retryable or attempt >= max_retries:
+                return response
+            retry_delay = retry_after_delay(response)
+            # Waits longer than any backoff would be spent asleep inside the source's timeout, so give up instead
+            if retry_delay is not None and retry_delay > backoff_max:
+                logger.warning(
+                    "Giving up on %s, Retry-After of %.0fs exceeds %.0fs"
+                    % (url, retry_delay, backoff_max)
+                )
+                return response
+
+        if retry_delay is None:
+            retry_delay = random.uniform(0, min(backoff_max, backoff_base * 2**attempt))
+        attempt += 1
+        logger.info(
+            "Retrying %s in %.1fs (attempt %s of %s)"
+            % (url, retry_delay, attempt, max_retries)
+        )
+        run_metrics.record_stage(metrics_source, "sleep", retry_delay)
+        sleep(retry_delay)
+
+
+def generic_get_request_wrap(url, handler_func, **retry_kwargs):
+    if response_archive.is_replaying():
+        return handler_func(response_archive.replay_response(url))
+
+    response = request_with_retries("GET", url, **retry_kwargs)
     status_code = response.status_code
     if status_code != 200:
         raise ValueError(
@@ -66,11 +650,17 @@ def generic_get_request_wrap(url, handler_func):
             % (url, status_code)
         )
     raw_response = response.text
+    response_archive.archive_response(url, raw_response)
     return handler_func(raw_response)
 
 
-def generic_post_request_wrap(url, handler_func, pl=None):
-    response = requests.post(url, json=pl)
+def generic_post_request_wrap(url, handler_func, pl=None, **retry_kwargs):
+    if response_archive.is_replaying():
+        return handler_func(
+            response_archive.replay_response(url, method="POST", payload=pl)
+        )
+
+    response = request_with_retries("POST", url, json=pl, **retry_kwargs)
     status_code = response.status_code
     if status_code != 200:
         raise ValueError(
@@ -78,9 +668,278 @@ def generic_post_request_wrap(url, handler_func, pl=None):
             % (url, status_code)
         )
     raw_response = response.text
+    response_archive.archive_response(url, raw_response, method="POST", payload=pl)
     return handler_func(raw_response)
 
 
+# lxml is an optional, much faster backend for BeautifulSoup
+DEFAULT_HTML_PARSER = "lxml" if find_spec("lxml") is not None else "html.parser"
+
+
+def build_soup_strainer(class_tokens: list = (), attr_values: dict = None):
+    """
+    Build a SoupStrainer keeping only tags carrying one of the class tokens or attribute values, along with their subtrees
+    """
+    from bs4 import SoupStrainer
+
+    class_tokens = frozenset(class_tokens)
+    if attr_values is None:
+        attr_values = {}
+
+    def tag_match(tag_name, tag_attrs):
+        tag_classes = tag_attrs.get("class", ())
+        if isinstance(tag_classes, str):
+            tag_classes = tag_classes.split()
+        if not class_tokens.isdisjoint(tag_classes):
+            return True
+        return any(tag_attrs.get(k) == v for k, v in attr_values.items())
+
+    return SoupStrainer(tag_match)
+
+
+def soup_from_source(
+    page_source: str, parse_only=None, html_parser: str = DEFAULT_HTML_PARSER
+):
+    """
+    Parse page source into soup, optionally building only the subtrees kept by a strainer
+    """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(page_source, html_parser, parse_only=parse_only)
+
+
+JSON_LD_PATTERN = re.compile(
+    r"<script[^>]*type=[\"']application/ld\+json[\"'][^>]*>(.*?)</script>",
+    re.DOTALL | re.IGNORECASE,
+)
+
+
+def extract_json_ld(page_source: str):
+    """
+    Objects of every JSON-LD script in a page, found in one regex scan without building any soup.
+    @graph lists and top level arrays are flattened, scripts that fail to decode are skipped
+    """
+    json_ld_objs = []
+    for script_match in JSON_LD_PATTERN.finditer(page_source):
+        try:
+            script_data = json.loads(script_match.group(1))
+        except ValueError:
+            continue
+        pending_objs = script_data if isinstance(script_data, list) else [script_data]
+        for json_ld_obj in pending_objs:
+            if not isinstance(json_ld_obj, dict):
+                continue
+            json_ld_objs.append(json_ld_obj)
+            if isinstance(json_ld_obj.get("@graph"), list):
+                json_ld_objs.extend(
+                    x for x in json_ld_obj["@graph"] if isinstance(x, dict)
+                )
+
+    return json_ld_objs
+
+
+PROXY_DEFAULT_TARGET_URL = "https://www.google.com"
+
+
+class ProxyPool:
+    """
+    Probes proxies concurrently with a cheap HEAD request through each proxy to the target domain,
+    ranking working proxies by success rate then mean latency
+    """
+
+    def __init__(
+        self,
+        proxies: list,
+        target_url: str = PROXY_DEFAULT_TARGET_URL,
+        n_probes: int = 2,
+        probe_timeout: float = 10,
+        max_workers: int = 32,
+    ):
+        self.target_url = target_url
+        self.n_probes = n_probes
+        self.probe_timeout = probe_timeout
+        self.pick_idx = 0
+        self.pool_lock = threading.Lock()
+        with run_metrics.stage_timer(run_metrics.source_label(target_url), "proxy"):
+            self.proxy_stats = self.rank_proxies(proxies, max_workers=max_workers)
+        self.ranked_proxies = [x["proxy"] for x in self.proxy_stats]
+        logger.info(
+            "%s of %s proxies passed validation against %s"
+            % (len(self.ranked_proxies), len(proxies), target_url)
+        )
+
+    def probe_proxy(self, proxy_ip: str):
+        """
+        Time repeated HEAD requests to the target through a single proxy
+        """
+        proxy_url = "http://%s" % proxy_ip
+        proxy_dict = {"http": proxy_url, "https": proxy_url}
+        latencies = []
+        for _ in range(self.n_probes):
+            probe_start = monotonic()
+            try:
+                response = requests.head(
+                    self.target_url,
+                    proxies=proxy_dict,
+                    timeout=self.probe_timeout,
+                    allow_redirects=False,
+                )
+            except requests.RequestException:
+                continue
+            if response.status_code < 500:
+                latencies.append(monotonic() - probe_start)
+
+        success_rate = len(latencies) / self.n_probes
+        if len(latencies) == 0:
+            mean_latency = float("inf")
+        else:
+            mean_latency = sum(latencies) / len(latencies)
+
+        return {
+            "proxy": proxy_ip,
+            "success_rate": success_rate,
+            "mean_latency": mean_latency,
+        }
+
+    def rank_proxies(self, proxies: list, max_workers: int = 32):
+        """
+        Probe all proxies concurrently, returning stats of working proxies best first
+        """
+        if len(proxies) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(proxies))) as executor:
+            all_proxy_stats = list(executor.map(self.probe_proxy, proxies))
+        working_proxy_stats = [x for x in all_proxy_stats if x["success_rate"] > 0]
+        working_proxy_stats.sort(key=lambda x: (-x["success_rate"], x["mean_latency"]))
+
+        return working_proxy_stats
+
+    def get(self, sequential_pick: bool = True):
+        """
+        Pick a proxy, walking the ranking best first when sequential or at random otherwise
+        """
+        with self.pool_lock:
+            if len(self.ranked_proxies) == 0:
+                raise ValueError(
+                    "No working proxies available for %s" % self.target_url
+                )
+            if sequential_pick:
+                proxy_idx = self.pick_idx % len(self.ranked_proxies)
+                self.pick_idx += 1
+            else:
+                proxy_idx = random.randrange(0, len(self.ranked_proxies))
+
+            return self.ranked_proxies[proxy_idx]
+
+    def report_failure(self, proxy_ip: str):
+        """
+        Drop a proxy from the ranking after it fails in use
+        """
+        with self.pool_lock:
+            if proxy_ip in self.ranked_proxies:
+                self.ranked_proxies.remove(proxy_ip)
+                logger.info("Dropped proxy %s from pool" % proxy_ip)
+
+
+PROXY_POOLS = {}
+PROXY_POOLS_LOCK = threading.Lock()
+
+
+def get_proxy_pool(
+    proxies: list, target_url: str = PROXY_DEFAULT_TARGET_URL, **pool_kwargs
+):
+    """
+    Return the shared ranked proxy pool for a proxy list and target domain, validating on first use
+    """
+    pool_key = (tuple(proxies), urlparse(target_url).netloc)
+    with PROXY_POOLS_LOCK:
+        proxy_pool = PROXY_POOLS.get(pool_key)
+        if proxy_pool is None:
+            proxy_pool = ProxyPool(proxies, target_url=target_url, **pool_kwargs)
+            PROXY_POOLS[pool_key] = proxy_pool
+
+    return proxy_pool
+
+
+def read_proxy_file(proxy_list_path: str):
+    """
+    Read newline separated proxy addresses, skipping blank lines
+    """
+    with open(proxy_list_path, "r") as proxy_file:
+        raw_proxy_file = proxy_file.read()
+
+    return [x.strip() for x in raw_proxy_file.split("\n") if x.strip() != ""]
+
+
+# A cache refreshed out of band by refresh_user_agents.py takes precedence over the bundled list
+USER_AGENT_CACHE_PATH = "db/user_agents_firefox.txt"
+USER_AGENT_BUNDLED_PATH = "static/user_agents_firefox.txt"
+USER_AGENT_DESKTOP_MARKERS = ("Windows NT", "Macintosh", "X11;")
+
+
+def is_desktop_firefox(user_agent: str):
+    """
+    Whether a user agent string is desktop Firefox, consistent with the Firefox driver it is sent from
+    """
+    return (
+        "Firefox/" in user_agent
+        and "Mobile" not in user_agent
+        and "Android" not in user_agent
+        and any(x in user_agent for x in USER_AGENT_DESKTOP_MARKERS)
+    )
+
+
+class UserAgentPool:
+    """
+    Desktop Firefox user agents read once from the first non empty file of user_agent_paths, picked at random from memory
+    """
+
+    def __init__(
+        self,
+        user_agent_paths: tuple = (USER_AGENT_CACHE_PATH, USER_AGENT_BUNDLED_PATH),
+    ):
+        self.user_agents = []
+        for user_agent_path in user_agent_paths:
+            if not os.path.exists(user_agent_path):
+                continue
+            with open(user_agent_path, "r") as user_agent_file:
+                self.user_agents = [
+                    x.strip() for x in user_agent_file if is_desktop_firefox(x.strip())
+                ]
+            if len(self.user_agents) > 0:
+                logger.info(
+                    "Loaded %s user agents from %s"
+                    % (len(self.user_agents), user_agent_path)
+                )
+                break
+        if len(self.user_agents) == 0:
+            raise ValueError(
+                "No desktop Firefox user agents found in %s" % (user_agent_paths,)
+            )
+
+    def random(self):
+        return random.choice(self.user_agents)
+
+
+USER_AGENT_POOLS = {}
+USER_AGENT_POOLS_LOCK = threading.Lock()
+
+
+def get_user_agent_pool(
+    user_agent_paths: tuple = (USER_AGENT_CACHE_PATH, USER_AGENT_BUNDLED_PATH),
+):
+    """
+    Return the shared user agent pool for a set of files, loading it on first use
+    """
+    with USER_AGENT_POOLS_LOCK:
+        user_agent_pool = USER_AGENT_POOLS.get(user_agent_paths)
+        if user_agent_pool is None:
+            user_agent_pool = UserAgentPool(user_agent_paths)
+            USER_AGENT_POOLS[user_agent_paths] = user_agent_pool
+
+    return user_agent_pool
+
+
 class Driver:
     def __init__(
         self,
@@ -90,40 +949,43 @@ class Driver:
         proxy_sequential_pick: bool = True,
         proxy_timeout: int = 10,
         selenium_timeout: int = 60,
+        proxy_target_url: str = PROXY_DEFAULT_TARGET_URL,
+        html_parser: str = DEFAULT_HTML_PARSER,
     ):
+        self.html_parser = html_parser
+        self.metrics_source = run_metrics.source_label(proxy_target_url)
         self.proxies = None
+        self.proxy_pool = None
+        self.proxy_ip = None
         self.driver_params = {
             "headless": headless,
             "selenium_timeout": selenium_timeout,
         }
+        # Pages loaded since the browser last started, for recycling long lived drivers
+        self.n_pages = 0
         if proxy_list is not None and proxy_list_path is not None:
             raise ValueError(
                 "Both proxy_list and proxy_list_path passed. Requires one or the other."
             )
 
         if proxy_list is not None:
-            self.proxy_idx = 0
             self.proxies = proxy_list
-            self.max_proxy_idx = len(self.proxies)
-            self.driver_params["proxy_sequential_pick"] = proxy_sequential_pick
-            self.driver_params["proxy_timeout"] = proxy_timeout
-            self.thread_queue = Queue()
 
         if proxy_list_path is not None:
-            self.proxy_idx = 1
-            proxy_file = open(proxy_list_path, "r")
-            raw_proxy_file = proxy_file.read()
-            self.proxies = raw_proxy_file.split("\n")
-            self.max_proxy_idx = len(self.proxies)
+            self.proxies = read_proxy_file(proxy_list_path)
+
+        if self.proxies is not None:
+            self.proxy_pool = get_proxy_pool(
+                self.proxies, target_url=proxy_target_url, probe_timeout=proxy_timeout
+            )
             self.driver_params["proxy_sequential_pick"] = proxy_sequential_pick
-            self.driver_params["proxy_timeout"] = proxy_timeout
-            self.thread_queue = Queue()
 
-        self.driver_init(**self.driver_params)
+        with run_metrics.stage_timer(self.metrics_source, "driver_start"):
+            self.driver_init(**self.driver_params)
+
+    def proxy_driver_init(self, proxy_ip: str, headless: bool = False):
+        from selenium import webdriver
 
-    def threaded_proxy_driver_init(
-        self, proxy_ip: str, headless: bool = False, thread_sniff: bool = False
-    ):
         opts = self.driver_opts_init(headless=headless)
         opts.add_argument("--proxy-server=%s" % proxy_ip)
 
@@ -131,55 +993,47 @@ class Driver:
         driver_window_pos_x = random.randrange(0, 1920)
         driver_window_pos_y = random.randrange(0, 1080)
         driver.set_window_position(driver_window_pos_x, driver_window_pos_y)
-        if thread_sniff:
-            self.thread_queue.put(proxy_ip)
-            logger.info("Driver succesfully verified proxy. Quitting this instance.")
-            driver.quit()
-        else:
-            logger.info("Driver succesfully created at %s" % proxy_ip)
-            return driver
+        logger.info("Driver succesfully created at %s" % proxy_ip)
+        return driver
 
     def driver_init(
         self,
         headless: bool = False,
         proxy_sequential_pick: bool = True,
         selenium_timeout: int = 60,
-        proxy_timeout: int = 10,
         n_proxy_tries: int = 10,
     ):
+        """
+        Launch Firefox, through the best ranked proxy available if proxies are in use
+        """
+        from selenium import webdriver
+        from selenium.common.exceptions import WebDriverException
+
         self.driver = None
-        if self.proxies is not None:
+        if self.proxy_pool is not None:
             n_tries = 0
-            while n_tries < n_proxy_tries:
+            while self.driver is None:
+                if n_tries >= n_proxy_tries:
+                    raise ValueError(
+                        "Unable to start driver after %s proxy attempts" % n_tries
+                    )
                 n_tries += 1
-                proxy_ip = self.proxy_get(proxy_sequential_pick)
-                driver_process = Process(
-                    target=self.threaded_proxy_driver_init,
-                    name="Threaded_Driver",
-                    args=(proxy_ip, headless, True),
-                )
-                driver_process.start()
-                driver_process.join(proxy_timeout)
-
-                # breakpoint()
-
-                if driver_process.is_alive():
-                    driver_process.terminate()
-                    driver_process.join()
-                    continue
-
-                succesful_proxy_ip = self.thread_queue.get()
-                break
-            self.driver = self.threaded_proxy_driver_init(
-                succesful_proxy_ip, headless, False
-            )
+                self.proxy_ip = self.proxy_get(proxy_sequential_pick)
+                try:
+                    self.driver = self.proxy_driver_init(self.proxy_ip, headless)
+                except WebDriverException:
+                    logger.exception("Driver failed to start at %s" % self.proxy_ip)
+                    self.proxy_pool.report_failure(self.proxy_ip)
         else:
             opts = self.driver_opts_init(headless=headless)
             self.driver = webdriver.Firefox(options=opts)
 
         self.driver.set_page_load_timeout(selenium_timeout)
+        self.n_pages = 0
 
     def driver_opts_init(self, headless: bool = False, randomize_ua: bool = True):
+        from selenium import webdriver
+
         opts = webdriver.FirefoxOptions()
         opts.add_argument("--enable-javascript")
         window_x = random.randrange(1000, 2000)
@@ -187,50 +1041,607 @@ class Driver:
         opts.add_argument("--width=%s" % window_x)
         opts.add_argument("--height=%s" % window_y)
         if randomize_ua:
-            ua = UserAgent()
-            user_agent = ua.random
-            opts.add_argument("--user-agent=%s" % user_agent)
+            # Firefox has no user agent flag, the UA is overridden through its pref
+            user_agent = get_user_agent_pool().random()
+            opts.set_preference("general.useragent.override", user_agent)
         if headless:
             opts.add_argument("--headless")
 
         return opts
 
     def proxy_get(self, sequential_pick: bool = False):
-        if sequential_pick:
-            proxy_idx = self.proxy_idx
-            self.proxy_idx += 1
-            if self.proxy_idx == self.max_proxy_idx:
-                self.proxy_idx = 0
-        else:
-            max_proxy_idx = len(self.proxies) - 1
-            proxy_idx = random.randrange(0, max_proxy_idx)
-        proxy_ip = self.proxies[proxy_idx]
+        return self.proxy_pool.get(sequential_pick=sequential_pick)
+
+    def timed_load(self, url: str, test_element_class: str, by_method, load_delay: int):
+        """
+        Load a page then wait for its test element, timing the two as the fetch and wait stages
+        """
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
 
-        return proxy_ip
+        with run_metrics.stage_timer(self.metrics_source, "fetch"):
+            self.driver.get(url)
+        test_element = EC.presence_of_element_located((by_method, test_element_class))
+        with run_metrics.stage_timer(self.metrics_source, "wait"):
+            _ = WebDriverWait(self.driver, load_delay).until(test_element)
 
-    def selenium_soup_get(
-        self, url: int, test_element_class: str, by_method, load_delay: int = 10
+    def paced_load(
+        self,
+        pacing_controller,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int,
     ):
         """
-        Function for Selenium get request awaiting load of test element
+        timed_load in the pacing controller's next slot, feeding it the outcome of the load whether or not it raises
         """
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+
+        pacing_controller.wait()
+        load_start = monotonic()
         try:
-            self.driver.get(url)
-            test_element = EC.presence_of_element_located(
-                (by_method, test_element_class)
+            self.timed_load(url, test_element_class, by_method, load_delay)
+        except TimeoutException:
+            pacing_controller.record("timeout")
+            raise
+        except WebDriverException:
+            pacing_controller.record("error")
+            raise
+        pacing_controller.record("ok", monotonic() - load_start)
+
+    def selenium_source_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+    ):
+        """
+        Function for Selenium get request awaiting load of test element, returning the page source.
+        Requests are spaced by the domain's pacing controller, which is fed each load's outcome
+        """
+        from selenium.common.exceptions import TimeoutException
+
+        pacing_controller = get_pacing_controller(url)
+        try:
+            self.paced_load(
+                pacing_controller, url, test_element_class, by_method, load_delay
             )
-            _ = WebDriverWait(self.driver, load_delay).until(test_element)
         except TimeoutException:
             self.driver.quit()
+            if self.proxy_pool is not None:
+                self.proxy_pool.report_failure(self.proxy_ip)
             logger.info("Restarting driver")
-            self.driver_init(**self.driver_params)
-            self.driver.get(url)
-            test_element = EC.presence_of_element_located(
-                (by_method, test_element_class)
+            with run_metrics.stage_timer(self.metrics_source, "driver_start"):
+                self.driver_init(**self.driver_params)
+            self.paced_load(
+                pacing_controller, url, test_element_class, by_method, load_delay
             )
-            _ = WebDriverWait(self.driver, load_delay).until(test_element)
+        self.n_pages += 1
 
         resp_source = self.driver.page_source
-        soup = BeautifulSoup(resp_source, "html.parser")
+        response_archive.archive_response(url, resp_source)
+
+        return resp_source
+
+    def selenium_soup_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+        parse_only=None,
+    ):
+        """
+        selenium_source_get parsed into soup. parse_only restricts the soup to a strainer's subtrees
+        """
+        resp_source = self.selenium_source_get(
+            url, test_element_class, by_method, load_delay=load_delay
+        )
+        with run_metrics.stage_timer(self.metrics_source, "parse"):
+            soup = soup_from_source(
+                resp_source, parse_only=parse_only, html_parser=self.html_parser
+            )
+
+        return soup
+
+    # Generic names shared with HttpDriver so parsers can run on either
+    source_get = selenium_source_get
+    soup_get = selenium_soup_get
+
+    def browser_rss_mib(self):
+        """
+        Resident memory of geckodriver and the Firefox processes under it, None where it cannot be read
+        """
+        try:
+            root_pid = self.driver.service.process.pid
+        except AttributeError:
+            return None
+
+        return process_tree_rss_mib(root_pid)
+
+    def needs_recycle(self, max_pages: int = None, max_rss_mib: float = None):
+        if max_pages is not None and self.n_pages >= max_pages:
+            return True
+        if max_rss_mib is not None:
+            rss_mib = self.browser_rss_mib()
+            return rss_mib is not None and rss_mib > max_rss_mib
+
+        return False
+
+    def recycle(self):
+        """
+        Restart the browser in place, on the next proxy if proxies are in use
+        """
+        self.driver.quit()
+        with run_metrics.stage_timer(self.metrics_source, "driver_start"):
+            self.driver_init(**self.driver_params)
+
+    def quit(self):
+        self.driver.quit()
+
+
+def process_tree_rss_mib(root_pid: int):
+    """
+    Summed resident memory of a process and its descendants read from /proc, None where /proc is unavailable
+    """
+    total_rss_kib = 0
+    pending_pids = [root_pid]
+    while pending_pids:
+        pid = pending_pids.pop()
+        try:
+            with open("/proc/%s/status" % pid) as status_file:
+                for status_line in status_file:
+                    if status_line.startswith("VmRSS:"):
+                        total_rss_kib += int(status_line.split()[1])
+                        break
+            for task_id in os.listdir("/proc/%s/task" % pid):
+                with open(
+                    "/proc/%s/task/%s/children" % (pid, task_id)
+                ) as children_file:
+                    pending_pids.extend(int(x) for x in children_file.read().split())
+        except (OSError, ValueError):
+            if pid == root_pid:
+                return None
+
+    return total_rss_kib / 1024
+
+
+HTTP_BROWSER_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1",
+}
+# Only markers specific to interstitial challenge pages, generic ones like captcha or noscript banners
+# also appear on ordinary server rendered pages
+HTTP_CHALLENGE_MARKERS = (
+    "challenge-platform",
+    "cf-chl",
+    "<title>Just a moment...</title>",
+)
+
+
+def has_test_element(page_source: str, test_element_class: str, by_method):
+    """
+    Cheap check that the element Selenium would wait for is in the served HTML
+    """
+    if by_method == BY_XPATH:
+        xpath_values = re.findall(r"@[\w-]+='([^']+)'", test_element_class)
+        return all(x in page_source for x in xpath_values)
+
+    return test_element_class in page_source
+
+
+class HttpDriver:
+    """
+    Browserless stand in for Driver fetching server rendered HTML over a keep-alive session through the proxy pool.
+    Falls back to a Selenium Driver for pages that look like a JS challenge
+    """
+
+    def __init__(
+        self,
+        headless: bool = False,
+        proxy_list: list = None,
+        proxy_list_path: str = None,
+        proxy_sequential_pick: bool = True,
+        proxy_timeout: int = 10,
+        selenium_timeout: int = 60,
+        proxy_target_url: str = PROXY_DEFAULT_TARGET_URL,
+        html_parser: str = DEFAULT_HTML_PARSER,
+    ):
+        # Kept to start an equivalent Selenium Driver on first challenge
+        self.fallback_driver_kwargs = {
+            "headless": headless,
+            "proxy_list": proxy_list,
+            "proxy_list_path": proxy_list_path,
+            "proxy_sequential_pick": proxy_sequential_pick,
+            "proxy_timeout": proxy_timeout,
+            "selenium_timeout": selenium_timeout,
+            "proxy_target_url": proxy_target_url,
+            "html_parser": html_parser,
+        }
+        self.fallback_driver = None
+        self.html_parser = html_parser
+        self.metrics_source = run_metrics.source_label(proxy_target_url)
+        self.proxy_sequential_pick = proxy_sequential_pick
+        self.request_timeout = selenium_timeout
+        self.proxy_pool = None
+        self.proxy_ip = None
+        self.n_pages = 0
+
+        proxies = proxy_list
+        if proxy_list_path is not None:
+            proxies = read_proxy_file(proxy_list_path)
+        if proxies is not None:
+            self.proxy_pool = get_proxy_pool(
+                proxies, target_url=proxy_target_url, probe_timeout=proxy_timeout
+            )
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(HTTP_BROWSER_HEADERS)
+        self.session.headers["User-Agent"] = get_user_agent_pool().random()
+        self.proxy_rotate()
+
+    def proxy_rotate(self):
+        """
+        Move the session onto the next proxy from the pool
+        """
+        if self.proxy_pool is None:
+            return
+        self.proxy_ip = self.proxy_pool.get(sequential_pick=self.proxy_sequential_pick)
+        proxy_url = "http://%s" % self.proxy_ip
+        self.session.proxies = {"http": proxy_url, "https": proxy_url}
+
+    def is_challenge(self, response, test_element_class: str, by_method):
+        """
+        Whether a response looks like a JS challenge or otherwise lacks the server rendered content
+        """
+        if response.status_code in (403, 429, 503):
+            return True
+        if any(x in response.text for x in HTTP_CHALLENGE_MARKERS):
+            return True
+
+        return not has_test_element(response.text, test_element_class, by_method)
+
+    def fallback_source_get(
+        self, url: str, test_element_class: str, by_method, **kwargs
+    ):
+        if self.fallback_driver is None:
+            logger.info("Starting Selenium fallback driver")
+            self.fallback_driver = Driver(**self.fallback_driver_kwargs)
+
+        return self.fallback_driver.selenium_source_get(
+            url, test_element_class, by_method, **kwargs
+        )
+
+    def source_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+    ):
+        """
+        Plain HTTP get returning the page source, with the same interface as Driver.selenium_source_get
+        """
+        pacing_controller = get_pacing_controller(url)
+        pacing_controller.wait()
+        request_start = monotonic()
+        try:
+            response = request_with_retries(
+                "GET", url, timeout=self.request_timeout, session=self.session
+            )
+        except requests.RequestException:
+            logger.exception("HTTP fetch failed at %s" % url)
+            pacing_controller.record("error")
+            if self.proxy_pool is not None:
+                self.proxy_pool.report_failure(self.proxy_ip)
+                self.proxy_rotate()
+            response = None
+
+        is_challenge = response is not None and self.is_challenge(
+            response, test_element_class, by_method
+        )
+        if is_challenge:
+            pacing_controller.record("throttled")
+        elif response is not None:
+            pacing_controller.record("ok", monotonic() - request_start)
+
+        if response is None or is_challenge:
+            logger.info("Falling back to Selenium for %s" % url)
+            return self.fallback_source_get(
+                url, test_element_class, by_method, load_delay=load_delay
+            )
+
+        self.n_pages += 1
+        response_archive.archive_response(url, response.text)
+
+        return response.text
+
+    def soup_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+        parse_only=None,
+    ):
+        """
+        source_get parsed into soup, with the same interface as Driver.selenium_soup_get
+        """
+        page_source = self.source_get(
+            url, test_element_class, by_method, load_delay=load_delay
+        )
+        with run_metrics.stage_timer(self.metrics_source, "parse"):
+            soup = soup_from_source(
+                page_source, parse_only=parse_only, html_parser=self.html_parser
+            )
+
+        return soup
+
+    def needs_recycle(self, max_pages: int = None, max_rss_mib: float = None):
+        if max_pages is not None and self.n_pages >= max_pages:
+            return True
+        if self.fallback_driver is not None:
+            return self.fallback_driver.needs_recycle(max_pages, max_rss_mib)
+
+        return False
+
+    def recycle(self):
+        """
+        Start afresh with a new user agent and proxy, closing any fallback browser until it is next needed
+        """
+        if self.fallback_driver is not None:
+            self.fallback_driver.quit()
+            self.fallback_driver = None
+        self.session.cookies.clear()
+        self.session.headers["User-Agent"] = get_user_agent_pool().random()
+        self.proxy_rotate()
+        self.n_pages = 0
+
+    def quit(self):
+        self.session.close()
+        if self.fallback_driver is not None:
+            self.fallback_driver.quit()
+
+
+class ReplayDriver:
+    """
+    Stand in for Driver serving page sources from the active response archive, for offline replays
+    """
+
+    def __init__(self, html_parser: str = DEFAULT_HTML_PARSER, **driver_kwargs):
+        # Proxy and browser settings are accepted for interface parity and ignored
+        self.html_parser = html_parser
+
+    def source_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+    ):
+        return response_archive.replay_response(url)
+
+    def soup_get(
+        self,
+        url: str,
+        test_element_class: str,
+        by_method,
+        load_delay: int = 10,
+        parse_only=None,
+    ):
+        page_source = self.source_get(url, test_element_class, by_method)
+        with run_metrics.stage_timer(run_metrics.source_label(url), "parse"):
+            soup = soup_from_source(
+                page_source, parse_only=parse_only, html_parser=self.html_parser
+            )
 
         return soup
+
+    def needs_recycle(self, max_pages: int = None, max_rss_mib: float = None):
+        return False
+
+    def recycle(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+# Drivers left running between daemon ticks, keyed by target domain, driver class and settings
+WARM_DRIVERS = {}
+WARM_DRIVERS_LOCK = threading.Lock()
+# Outside daemon mode released drivers are quit, and drivers are never recycled
+DRIVER_LIFECYCLE = {"keep_warm": False, "max_pages": None, "max_rss_mib": None}
+
+
+def configure_driver_lifecycle(
+    keep_warm: bool = False, max_pages: int = None, max_rss_mib: float = None
+):
+    """
+    Keep released drivers warm for reuse, recycling them after max_pages page loads or once their browser
+    outgrows max_rss_mib
+    """
+    DRIVER_LIFECYCLE.update(
+        {"keep_warm": keep_warm, "max_pages": max_pages, "max_rss_mib": max_rss_mib}
+    )
+
+
+def warm_driver_key(driver_class, driver_kwargs: dict):
+    return (
+        driver_kwargs.get("proxy_target_url"),
+        driver_class.__name__,
+        repr(sorted(driver_kwargs.items())),
+    )
+
+
+def acquire_driver(driver_class, driver_kwargs: dict):
+    """
+    Take a warm driver with matching settings if one is idle, otherwise start one
+    """
+    driver_key = warm_driver_key(driver_class, driver_kwargs)
+    with WARM_DRIVERS_LOCK:
+        idle_drivers = WARM_DRIVERS.get(driver_key)
+        if idle_drivers:
+            return idle_drivers.pop()
+
+    driver = driver_class(**driver_kwargs)
+    driver.warm_key = driver_key
+
+    return driver
+
+
+def recycle_if_needed(driver):
+    if driver.needs_recycle(
+        DRIVER_LIFECYCLE["max_pages"], DRIVER_LIFECYCLE["max_rss_mib"]
+    ):
+        logger.info("Recycling %s driver" % type(driver).__name__)
+        driver.recycle()
+
+
+def release_driver(driver):
+    """
+    Return a driver taken with acquire_driver, keeping it warm in daemon mode and quitting it otherwise
+    """
+    if not DRIVER_LIFECYCLE["keep_warm"]:
+        driver.quit()
+        return
+
+    try:
+        recycle_if_needed(driver)
+    except Exception:
+        logger.exception("Failed to recycle driver, dropping it")
+        driver.quit()
+        return
+    with WARM_DRIVERS_LOCK:
+        WARM_DRIVERS.setdefault(driver.warm_key, []).append(driver)
+
+
+def quit_warm_drivers(domain: str = None):
+    """
+    Quit idle warm drivers, only those targeting domain if given. Returns the number quit
+    """
+    with WARM_DRIVERS_LOCK:
+        quit_keys = [x for x in WARM_DRIVERS if domain is None or x[0] == domain]
+        quit_drivers = [y for x in quit_keys for y in WARM_DRIVERS.pop(x)]
+    for driver in quit_drivers:
+        try:
+            driver.quit()
+        except Exception:
+            logger.exception("Failed to quit warm driver")
+
+    return len(quit_drivers)
+
+
+def count_warm_drivers():
+    """
+    Idle warm drivers per target domain
+    """
+    warm_counts = {}
+    with WARM_DRIVERS_LOCK:
+        for driver_key, idle_drivers in WARM_DRIVERS.items():
+            warm_counts[driver_key[0]] = warm_counts.get(driver_key[0], 0) + len(
+                idle_drivers
+            )
+
+    return warm_counts
+
+
+class DriverPool:
+    """
+    Pool of Driver (or HttpDriver) workers, each on its own proxy and user agent, pulling work from a shared queue.
+    Requests are paced per domain by the drivers themselves
+    """
+
+    def __init__(
+        self,
+        n_workers: int = 2,
+        driver_kwargs: dict = None,
+        drivers: list = None,
+        driver_class=None,
+    ):
+        self.n_workers = n_workers
+        self.driver_class = driver_class if driver_class is not None else Driver
+        self.driver_kwargs = driver_kwargs if driver_kwargs is not None else {}
+        # Existing drivers are reused as workers, and are left to their owner after the pool finishes
+        self.shared_drivers = drivers if drivers is not None else []
+
+    def worker(self, worker_i: int, work_func, work_queue, result_queue):
+        """
+        Pull items from the work queue until empty, pushing (index, result) pairs to the result queue
+        """
+        owns_driver = worker_i >= len(self.shared_drivers)
+        if owns_driver:
+            try:
+                worker_driver = acquire_driver(self.driver_class, self.driver_kwargs)
+            except Exception:
+                logger.exception("Driver pool worker %s failed to start" % worker_i)
+                return
+        else:
+            worker_driver = self.shared_drivers[worker_i]
+
+        try:
+            while True:
+                try:
+                    item_i, item = work_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    result = work_func(item, worker_driver)
+                except Exception:
+                    logger.exception(
+                        "Driver pool worker %s failed on %s" % (worker_i, item)
+                    )
+                    result = None
+                result_queue.put((item_i, result))
+                try:
+                    recycle_if_needed(worker_driver)
+                except Exception:
+                    logger.exception(
+                        "Driver pool worker %s failed to recycle its driver" % worker_i
+                    )
+                    break
+        finally:
+            if owns_driver:
+                release_driver(worker_driver)
+
+    def map(self, work_func, items: list):
+        """
+        Run work_func(item, driver) over all items across the pool, returning results in item order.
+        Items that fail, or are left unprocessed because no worker could start, return None
+        """
+        work_queue = queue.Queue()
+        for item_i, item in enumerate(items):
+            work_queue.put((item_i, item))
+        result_queue = queue.Queue()
+
+        n_workers = min(self.n_workers, len(items))
+        worker_threads = [
+            threading.Thread(
+                target=self.worker,
+                name="Driver_Pool_%s" % worker_i,
+                args=(worker_i, work_func, work_queue, result_queue),
+            )
+            for worker_i in range(n_workers)
+        ]
+        for worker_thread in worker_threads:
+            worker_thread.start()
+        for worker_thread in worker_threads:
+            worker_thread.join()
+
+        results = [None] * len(items)
+        while not result_queue.empty():
+            item_i, result = result_queue.get()
+            results[item_i] = result
+        n_unprocessed = work_queue.qsize()
+        if n_unprocessed > 0:
+            logger.warning("Driver pool left %s items unprocessed" % n_unprocessed)
+
+        return results